@@ -0,0 +1,99 @@
+# benchmark_storage.py - Compare storage backends on a synthetic workload
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from weather_storage import BACKENDS, get_storage
+
+CITIES = ['London', 'New York', 'Tokyo', 'Sydney', 'Paris',
+          'Berlin', 'Madrid', 'Cairo', 'Lagos', 'Mumbai']
+
+
+def synthetic_rows(count, start=datetime(2024, 1, 1)):
+    """Readings spread evenly over CITIES, one per city every 10 minutes"""
+    rows = []
+    for i in range(count):
+        city = CITIES[i % len(CITIES)]
+        rows.append({
+            'city': city,
+            'country': 'XX',
+            'temperature': round(random.uniform(-10, 35), 2),
+            'feels_like': round(random.uniform(-15, 38), 2),
+            'humidity': random.randint(10, 100),
+            'pressure': random.randint(980, 1040),
+            'wind_speed': round(random.uniform(0, 20), 2),
+            'wind_direction': random.randint(0, 359),
+            'weather_condition': random.choice(['Clear', 'Clouds', 'Rain']),
+            'weather_description': 'synthetic',
+            'cloudiness': random.randint(0, 100),
+            'visibility': 10000,
+            'timestamp': (start + timedelta(minutes=10 * (i // len(CITIES)))).strftime('%Y-%m-%d %H:%M:%S'),
+            'data_quality_score': 100
+        })
+    return rows
+
+
+def timed(func, repeat=3):
+    """Best wall-clock time in milliseconds over a few runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_backend(backend, rows, directory):
+    storage = get_storage(backend, os.path.join(directory, f"bench.{backend}"))
+
+    results = {}
+    start = time.perf_counter()
+    storage.write_rows(rows)
+    results['bulk write'] = (time.perf_counter() - start) * 1000
+
+    reader = get_storage(backend, storage.db_path, read_only=True)
+    last_day = rows[-1]['timestamp'][:10]
+    results['latest'] = timed(reader.latest)
+    results['range scan (1 city)'] = timed(lambda: reader.range_scan(city='London'))
+    results['range scan (1 day)'] = timed(lambda: reader.range_scan(start=f"{last_day} 00:00:00"))
+    results['downsample 1h'] = timed(lambda: reader.range_scan(bucket=3600))
+    results['aggregate day'] = timed(lambda: reader.aggregate('day'))
+    results['aggregate month'] = timed(lambda: reader.aggregate('month'))
+    reader.close()
+    storage.close()
+    return results
+
+
+def main(row_count=100000):
+    backends = []
+    for backend in BACKENDS:
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                get_storage(backend, os.path.join(directory, 'probe'))
+            backends.append(backend)
+        except ImportError:
+            print(f"⚠️  Skipping {backend}: not installed")
+
+    print(f"📊 STORAGE BENCHMARK ({row_count:,} rows, {len(CITIES)} cities)")
+    print("=" * 60)
+
+    rows = synthetic_rows(row_count)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in backends:
+            print(f"⏱️  Running {backend}...")
+            results[backend] = benchmark_backend(backend, rows, directory)
+
+    print("\n" + f"{'operation':<22}" + ''.join(f"{b:>14}" for b in backends))
+    print("-" * (22 + 14 * len(backends)))
+    for operation in results[backends[0]]:
+        timings = ''.join(f"{results[b][operation]:>11.1f} ms" for b in backends)
+        print(f"{operation:<22}{timings}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
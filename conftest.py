@@ -0,0 +1,35 @@
+# conftest.py - Shared test fixtures
+from datetime import datetime, timedelta
+
+import pytest
+
+BASE_TIME = datetime(2024, 1, 1, 0, 0, 0)
+
+COUNTRIES = {'London': 'GB', 'Paris': 'FR'}
+
+
+def build_row(city, hours=0, temperature=10.0, **fields):
+    """One transformed ETL row, BASE_TIME + hours, with any column overridden"""
+    row = {
+        'city': city,
+        'country': COUNTRIES.get(city, 'GB'),
+        'temperature': temperature,
+        'feels_like': temperature,
+        'humidity': 60,
+        'pressure': 1013,
+        'wind_speed': 5.0,
+        'wind_direction': 270,
+        'weather_condition': 'Clear',
+        'weather_description': 'clear sky',
+        'cloudiness': 0,
+        'visibility': 10000,
+        'timestamp': (BASE_TIME + timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S'),
+        'data_quality_score': 100
+    }
+    row.update(fields)
+    return row
+
+
+@pytest.fixture
+def make_row():
+    return build_row
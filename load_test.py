@@ -0,0 +1,174 @@
+# load_test.py - Headless Dashboard Load Test
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from weather_storage import SQLiteStorage
+from weather_metrics import DerivedMetrics
+from weather_catalog import CityCatalog
+
+APPS = ('weather_dashboard.py', 'simple_dashboard.py')
+CONDITIONS = ['Clear', 'Clouds', 'Rain', 'Drizzle', 'Mist', 'Snow']
+
+
+def build_synthetic_db(directory, cities=20, days=3, interval_minutes=120, seed=42):
+    """Write a catalog and history ending now to directory/weather_data.db"""
+    rng = np.random.default_rng(seed)
+    db_path = os.path.join(directory, 'weather_data.db')
+
+    # City catalog with random coordinates
+    csv_path = os.path.join(directory, 'cities.csv')
+    names = [f"City {i:04d}" for i in range(1, cities + 1)]
+    catalog_df = pd.DataFrame({
+        'id': range(1, cities + 1),
+        'name': names,
+        'country': [f"C{i % 40:02d}" for i in range(cities)],
+        'lat': rng.uniform(-60, 70, cities).round(4),
+        'lon': rng.uniform(-180, 180, cities).round(4),
+        'tier': rng.integers(1, 4, cities),
+        'region': ''
+    })
+    catalog_df.to_csv(csv_path, index=False)
+
+    catalog = CityCatalog(db_path)
+    catalog.load_csv(csv_path)
+
+    # Readings every interval_minutes for every city, built column-wise
+    steps = int(days * 24 * 60 / interval_minutes)
+    now = datetime.now().replace(second=0, microsecond=0)
+    times = [now - timedelta(minutes=interval_minutes * (steps - 1 - s)) for s in range(steps)]
+    hours = np.array([t.hour for t in times])
+
+    base = rng.uniform(-5, 30, cities)
+    diurnal = 5 * np.sin((hours - 9) / 24 * 2 * np.pi)
+    temperature = (base[None, :] + diurnal[:, None] + rng.normal(0, 1.5, (steps, cities))).round(2)
+
+    history = pd.DataFrame({
+        'city': np.tile(names, steps),
+        'country': np.tile(catalog_df['country'], steps),
+        'temperature': temperature.ravel(),
+        'feels_like': (temperature - rng.uniform(0, 3, (steps, cities))).ravel().round(2),
+        'humidity': rng.integers(20, 100, steps * cities),
+        'pressure': rng.integers(985, 1035, steps * cities),
+        'wind_speed': rng.uniform(0, 15, steps * cities).round(2),
+        'wind_direction': rng.integers(0, 360, steps * cities),
+        'weather_condition': rng.choice(CONDITIONS, steps * cities),
+        'weather_description': 'synthetic',
+        'cloudiness': rng.integers(0, 100, steps * cities),
+        'visibility': 10000,
+        'timestamp': np.repeat([t.strftime('%Y-%m-%d %H:%M:%S') for t in times], cities),
+        'data_quality_score': 100
+    })
+
+    rows = DerivedMetrics().enrich(history.to_dict('records'))
+    storage = SQLiteStorage(db_path)
+    storage.write_rows(rows)
+    catalog.update_latest(rows[-cities:])
+    catalog.close()
+
+    print(f"🧪 Synthetic database: {cities} cities × {steps} readings = {len(rows):,} rows")
+    return db_path
+
+
+def run_session(app_path, session, interactions, timeout, profile):
+    """One simulated user: first load, then switching cities"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    if profile:
+        at.query_params['profile'] = '1'
+
+    latencies, profiles = [], []
+    for step in range(interactions + 1):
+        if step > 0:
+            options = at.selectbox[0].options
+            at.selectbox[0].select(options[(session + step) % len(options)])
+
+        start = time.perf_counter()
+        at.run()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if at.exception:
+            raise RuntimeError(f"Session {session} failed: {at.exception[0].message}")
+        if profile and 'render_profile' in at.session_state:
+            profiles.append(at.session_state['render_profile'])
+
+    return latencies, profiles
+
+
+def summarize(latencies):
+    values = np.array(latencies)
+    return {
+        'renders': len(values),
+        'p50 ms': np.percentile(values, 50),
+        'p95 ms': np.percentile(values, 95),
+        'max ms': values.max(),
+        'mean ms': values.mean()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless render load test for the dashboards")
+    parser.add_argument('--app', choices=APPS, default='weather_dashboard.py')
+    parser.add_argument('--sessions', type=int, default=10, help="simulated user sessions")
+    parser.add_argument('--interactions', type=int, default=3, help="city switches per session")
+    parser.add_argument('--cities', type=int, default=20)
+    parser.add_argument('--days', type=float, default=3)
+    parser.add_argument('--interval', type=int, default=120, help="minutes between readings")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds allowed per render")
+    parser.add_argument('--profile', action='store_true', help="collect per-section timings")
+    args = parser.parse_args()
+
+    app_path = os.path.abspath(args.app)
+
+    with tempfile.TemporaryDirectory() as directory:
+        build_synthetic_db(directory, args.cities, args.days, args.interval)
+
+        # The dashboards open their files relative to the working directory
+        previous_cwd = os.getcwd()
+        os.chdir(directory)
+        os.environ['WEATHER_STORAGE'] = 'sqlite'
+        os.environ.pop('WEATHER_DB_PATH', None)
+        os.environ.pop('WEATHER_API_URL', None)
+
+        print(f"🚦 Running {args.sessions} sessions × {args.interactions + 1} renders of {args.app}")
+        first_loads, reruns, profiles = [], [], []
+        try:
+            for session in range(args.sessions):
+                latencies, session_profiles = run_session(
+                    app_path, session, args.interactions, args.timeout, args.profile
+                )
+                first_loads.append(latencies[0])
+                reruns += latencies[1:]
+                profiles += session_profiles
+        finally:
+            os.chdir(previous_cwd)
+
+    print("\n📈 RENDER LATENCY")
+    print("=" * 60)
+    summary = pd.DataFrame({
+        'first load': summarize(first_loads),
+        'city switch': summarize(reruns) if reruns else {},
+        'all renders': summarize(first_loads + reruns)
+    }).T
+    print(summary.round(1).to_string())
+
+    if profiles:
+        print("\n⏱️  SECTION BREAKDOWN (per render)")
+        print("=" * 60)
+        sections = pd.concat(profiles)
+        breakdown = sections.groupby('section', sort=False)['ms'].agg(
+            p50=lambda ms: np.percentile(ms, 50),
+            p95=lambda ms: np.percentile(ms, 95)
+        )
+        print(breakdown.round(2).to_string())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,20 @@
 # simple_dashboard.py - Works without Plotly!
 import streamlit as st
 import pandas as pd
-import sqlite3
+import os
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
+from weather_api import load_from_api, load_map_from_api, fetch_series
+from weather_notify import UpdateListener
+from weather_storage import get_storage
+from weather_catalog import CityCatalog, catalog_db_path
+from weather_profiling import RenderProfiler, section
+
+# Point the dashboard at the query service instead of opening SQLite directly
+API_URL = os.environ.get('WEATHER_API_URL')
+
+# How often the live trends fragment checks for new ETL loads
+REFRESH_SECONDS = 30
 
 # Page configuration
 st.set_page_config(
@@ -31,32 +42,44 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_weather_data():
-    """Load data from SQLite database"""
+@st.cache_resource
+def get_reader():
+    """Read-only storage handle shared by all sessions"""
+    return get_storage(read_only=True)
+
+@st.cache_resource
+def get_catalog():
+    """Read-only city catalog shared by all sessions"""
+    reader = get_reader()
+    return CityCatalog(catalog_db_path(reader.name, reader.db_path), read_only=True)
+
+def load_map_data(level):
+    """Latest reading per catalog city and a rollup, without touching raw history"""
     try:
-        conn = sqlite3.connect('weather_data.db')
-        
-        # Get latest data for each city
-        latest_query = """
-        SELECT wh1.* FROM weather_history wh1
-        INNER JOIN (
-            SELECT city, MAX(timestamp) as max_timestamp 
-            FROM weather_history 
-            GROUP BY city
-        ) wh2 ON wh1.city = wh2.city AND wh1.timestamp = wh2.max_timestamp
-        """
-        
-        df_latest = pd.read_sql_query(latest_query, conn)
+        if API_URL:
+            return load_map_from_api(API_URL, level)
         
-        # Get historical data for charts
-        historical_query = """
-        SELECT * FROM weather_history 
-        WHERE timestamp >= datetime('now', '-3 days')
-        ORDER BY timestamp
-        """
+        catalog = get_catalog()
+        return catalog.latest_map(), catalog.rollup(level)
+    except Exception:
+        # Catalog not loaded yet - the map section is simply skipped
+        return pd.DataFrame(), pd.DataFrame()
+
+def load_weather_data():
+    """Load data from the query service, or the configured storage backend"""
+    if API_URL:
+        try:
+            return load_from_api(API_URL, days=3)
+        except Exception as e:
+            st.error(f"Query service error: {e}")
+            return pd.DataFrame(), pd.DataFrame()
+    
+    try:
+        storage = get_reader()
         
-        df_historical = pd.read_sql_query(historical_query, conn)
-        conn.close()
+        # Latest data for each city, plus the last 3 days for charts
+        df_latest = storage.latest()
+        df_historical = storage.range_scan(days=3)
         
         return df_latest, df_historical
         
@@ -66,16 +89,113 @@ def load_weather_data():
 
 def create_simple_chart(data, x_col, y_col, title, color='blue'):
     """Create a simple matplotlib chart"""
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(data[x_col], data[y_col], color=color, linewidth=2, marker='o')
-    ax.set_title(title, fontsize=14, fontweight='bold')
-    ax.set_ylabel(y_col.replace('_', ' ').title())
-    ax.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    with section('figure build'):
+        fig, ax = plt.subplots(figsize=(10, 4))
+        ax.plot(data[x_col], data[y_col], color=color, linewidth=2, marker='o')
+        ax.set_title(title, fontsize=14, fontweight='bold')
+        ax.set_ylabel(y_col.replace('_', ' ').title())
+        ax.grid(True, alpha=0.3)
+        plt.xticks(rotation=45)
+    with section('tight_layout'):
+        plt.tight_layout()
     return fig
 
-def main():
+def append_to_chart(fig, new_rows, x_col, y_col, color='blue'):
+    """Draw only the new points onto an existing chart"""
+    ax = fig.axes[0]
+    last_line = ax.lines[-1]
+    
+    # Start from the previous last point so the line stays continuous
+    x = [last_line.get_xdata()[-1]] + list(new_rows[x_col])
+    y = [last_line.get_ydata()[-1]] + list(new_rows[y_col])
+    ax.plot(x, y, color=color, linewidth=2, marker='o')
+    ax.tick_params(axis='x', labelrotation=45)
+
+def has_derived_metrics(df):
+    """True once the ETL has stored derived metric columns"""
+    return 'dew_point' in df.columns and df['dew_point'].notna().any()
+
+def load_new_rows(city, after_id):
+    """Load only the rows added for a city since the last chart update"""
+    if API_URL:
+        return pd.DataFrame(fetch_series(API_URL, city=city, after_id=after_id))
+    
+    return get_reader().range_scan(city=city, after_id=after_id)
+
+def append_points(charts, new_rows):
+    """Extend the existing trend charts instead of redrawing them"""
+    new_rows = new_rows[new_rows['id'] > charts['last_id']]
+    if new_rows.empty:
+        return
+    
+    if charts['temperature'] is not None:
+        append_to_chart(charts['temperature'], new_rows, 'timestamp', 'temperature', 'red')
+        append_to_chart(charts['humidity'], new_rows, 'timestamp', 'humidity', 'blue')
+    
+    charts['last_id'] = int(new_rows['id'].max())
+
+def get_live_charts(selected_city, city_historical):
+    """Trend charts for a city, kept in session state between reruns"""
+    live_charts = st.session_state.setdefault('live_charts', {})
+    charts = live_charts.get(selected_city)
+    
+    # Charts need at least two points; until then keep rebuilding
+    if charts is None or charts['temperature'] is None:
+        charts = {'last_id': int(city_historical['id'].max()), 'temperature': None, 'humidity': None}
+        if len(city_historical) > 1:
+            charts['temperature'] = create_simple_chart(
+                city_historical, 'timestamp', 'temperature', 
+                f'Temperature Trend in {selected_city}', 'red'
+            )
+            charts['humidity'] = create_simple_chart(
+                city_historical, 'timestamp', 'humidity',
+                f'Humidity Trend in {selected_city}', 'blue'
+            )
+        live_charts[selected_city] = charts
+    else:
+        # Full rerun - only add rows the charts haven't seen yet
+        append_points(charts, city_historical)
+    
+    return charts
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_trends(selected_city, city_historical):
+    """Trend charts that pick up new ETL loads without rerunning the page"""
+    charts = get_live_charts(selected_city, city_historical)
+    
+    if 'update_listener' not in st.session_state:
+        st.session_state['update_listener'] = UpdateListener()
+    listener = st.session_state['update_listener']
+    update = listener.poll()
+    
+    if update and max(update['new_ids'].get(selected_city, [0])) > charts['last_id']:
+        try:
+            append_points(charts, load_new_rows(selected_city, charts['last_id']))
+        except Exception as e:
+            st.error(f"Live update error: {e}")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown(f"#### Temperature Trend - {selected_city}")
+        if charts['temperature'] is not None:
+            with section('pyplot: temperature'):
+                st.pyplot(charts['temperature'])
+        else:
+            st.info("Need more data points for trend analysis")
+    
+    with col2:
+        st.markdown(f"#### Humidity Trend - {selected_city}")
+        if charts['humidity'] is not None:
+            with section('pyplot: humidity'):
+                st.pyplot(charts['humidity'])
+        else:
+            st.info("Need more data points for trend analysis")
+    
+    if update:
+        st.caption(f"🔄 Live update received at {update['timestamp']}")
+
+def render_dashboard():
     # Header
     st.markdown('<h1 class="main-header">🌤️ Real-time Weather Analytics Dashboard</h1>', 
                 unsafe_allow_html=True)
@@ -83,7 +203,8 @@ def main():
     st.markdown("### Live weather data from major cities worldwide • Built with Python & Streamlit")
     
     # Load data
-    df_latest, df_historical = load_weather_data()
+    with section('data load'):
+        df_latest, df_historical = load_weather_data()
     
     if df_latest.empty:
         st.warning("🚨 No weather data available. Run the ETL pipeline first!")
@@ -96,6 +217,12 @@ def main():
     
     selected_city = st.sidebar.selectbox("📍 Select City", df_latest['city'].unique())
     
+    all_cities = list(df_latest['city'].unique())
+    compare_cities = st.sidebar.multiselect("🌍 Compare Cities", all_cities, default=all_cities[:20])
+    df_compare = df_latest[df_latest['city'].isin(compare_cities)] if compare_cities else df_latest
+    
+    rollup_level = st.sidebar.radio("🗺️ Map Rollup", ['country', 'region'])
+    
     # Last update time
     latest_timestamp = pd.to_datetime(df_latest['timestamp']).max()
     st.sidebar.markdown(f"**Last Updated:** {latest_timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -151,47 +278,44 @@ def main():
         city_historical = df_historical[df_historical['city'] == selected_city]
         
         if not city_historical.empty:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown(f"#### Temperature Trend - {selected_city}")
-                if len(city_historical) > 1:
-                    fig_temp = create_simple_chart(
-                        city_historical, 'timestamp', 'temperature', 
-                        f'Temperature Trend in {selected_city}', 'red'
-                    )
-                    st.pyplot(fig_temp)
-                else:
-                    st.info("Need more data points for trend analysis")
+            with section('chart: live trends'):
+                live_trends(selected_city, city_historical)
             
-            with col2:
-                st.markdown(f"#### Humidity Trend - {selected_city}")
-                if len(city_historical) > 1:
-                    fig_humidity = create_simple_chart(
-                        city_historical, 'timestamp', 'humidity',
-                        f'Humidity Trend in {selected_city}', 'blue'
-                    )
-                    st.pyplot(fig_humidity)
-                else:
-                    st.info("Need more data points for trend analysis")
+            # Derived metrics are stored columns, so these charts cost no extra queries
+            if has_derived_metrics(city_historical):
+                st.markdown("## 🧪 Comfort Indices")
+                
+                col1, col2 = st.columns(2)
+                
+                with col1, section('chart: comfort indices'):
+                    st.markdown(f"#### Comfort Indices - {selected_city}")
+                    indices = city_historical.set_index('timestamp')[
+                        ['temperature', 'dew_point', 'heat_index', 'wind_chill']
+                    ]
+                    st.line_chart(indices)
+                
+                with col2, section('chart: 24h change'):
+                    st.markdown("#### 24h Temperature Change")
+                    delta_data = df_latest.set_index('city')['temperature_delta_24h'].sort_values(ascending=False)
+                    st.bar_chart(delta_data)
     
     # City Comparison
     st.markdown("## 🌍 Global City Comparison")
     
     col1, col2 = st.columns(2)
     
-    with col1:
+    with col1, section('chart: temperature bar'):
         st.markdown("#### Current Temperatures")
         
         # Create a simple bar chart using Streamlit's native bar_chart
-        temp_data = df_latest.set_index('city')['temperature'].sort_values(ascending=False)
+        temp_data = df_compare.set_index('city')['temperature'].sort_values(ascending=False)
         st.bar_chart(temp_data)
     
-    with col2:
+    with col2, section('table: conditions'):
         st.markdown("#### Weather Conditions")
         
         # Display conditions in a table
-        conditions_df = df_latest[['city', 'weather_condition', 'temperature']].copy()
+        conditions_df = df_compare[['city', 'weather_condition', 'temperature']].copy()
         conditions_df['temperature'] = conditions_df['temperature'].round(1)
         conditions_df = conditions_df.sort_values('temperature', ascending=False)
         
@@ -200,21 +324,41 @@ def main():
             use_container_width=True
         )
     
-    # Raw Data Table
-    st.markdown("## 📋 Latest Weather Data")
+    # Map view and rollups come from the catalog's per-city latest table
+    with section('map data load'):
+        map_df, rollup_df = load_map_data(rollup_level)
     
-    display_columns = ['city', 'country', 'temperature', 'humidity', 
-                      'weather_condition', 'wind_speed', 'timestamp']
+    if not map_df.empty:
+        st.markdown("## 🗺️ Global Map")
+        
+        col1, col2 = st.columns([2, 1])
+        
+        with col1, section('chart: map'):
+            st.map(map_df[['lat', 'lon']])
+        
+        with col2, section('table: rollup'):
+            st.markdown(f"#### By {rollup_level.title()}")
+            rollup_display = rollup_df[[rollup_level, 'cities', 'avg_temperature', 'avg_humidity']].copy()
+            rollup_display['avg_temperature'] = rollup_display['avg_temperature'].round(1)
+            rollup_display['avg_humidity'] = rollup_display['avg_humidity'].round(1)
+            st.dataframe(rollup_display, use_container_width=True)
     
-    display_df = df_latest[display_columns].copy()
-    display_df['temperature'] = display_df['temperature'].round(1)
-    display_df.rename(columns={
-        'city': 'City', 'country': 'Country', 'temperature': 'Temp (°C)',
-        'humidity': 'Humidity (%)', 'weather_condition': 'Condition',
-        'wind_speed': 'Wind (m/s)', 'timestamp': 'Last Update'
-    }, inplace=True)
+    # Raw Data Table
+    st.markdown("## 📋 Latest Weather Data")
     
-    st.dataframe(display_df, use_container_width=True)
+    with section('table'):
+        display_columns = ['city', 'country', 'temperature', 'humidity', 
+                          'weather_condition', 'wind_speed', 'timestamp']
+        
+        display_df = df_latest[display_columns].copy()
+        display_df['temperature'] = display_df['temperature'].round(1)
+        display_df.rename(columns={
+            'city': 'City', 'country': 'Country', 'temperature': 'Temp (°C)',
+            'humidity': 'Humidity (%)', 'weather_condition': 'Condition',
+            'wind_speed': 'Wind (m/s)', 'timestamp': 'Last Update'
+        }, inplace=True)
+        
+        st.dataframe(display_df, use_container_width=True)
     
     # Footer
     st.markdown("---")
@@ -226,5 +370,12 @@ def main():
         unsafe_allow_html=True
     )
 
+def main():
+    # Opt-in profiling: ?profile=1|cprofile|pyinstrument or WEATHER_PROFILE
+    profiler = RenderProfiler.from_settings(st.query_params.get('profile'), name='simple_dashboard')
+    with profiler:
+        render_dashboard()
+    profiler.show()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,206 @@
+# test_api.py - Read-only HTTP query service
+import sqlite3
+import threading
+
+import pytest
+import requests
+
+from weather_api import STREAM_THRESHOLD, ResultCache, create_server
+from weather_catalog import CityCatalog, catalog_db_path
+from weather_storage import get_storage
+
+
+@pytest.fixture
+def writer(tmp_path, make_row):
+    storage = get_storage('sqlite', str(tmp_path / 'weather.db'))
+    storage.write_rows([make_row('London', m, 10 + m) for m in range(24)])
+    return storage
+
+
+def start_server(storage):
+    server = create_server(port=0, storage=storage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def server(writer):
+    server = start_server(get_storage('sqlite', writer.db_path, read_only=True))
+    yield server
+    stop_server(server)
+
+
+@pytest.fixture
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_cache_survives_reads_of_an_older_version():
+    cache = ResultCache()
+    cache.put('latest', '5', b'new')
+
+    # A thread that read the version just before the load finished
+    assert cache.get('latest', '4') is None
+    cache.put('latest', '4', b'old')
+
+    assert cache.get('latest', '5') == b'new'
+
+
+def test_etag_and_not_modified(base_url):
+    first = requests.get(f"{base_url}/latest")
+    assert first.status_code == 200
+    assert first.json()[0]['city'] == 'London'
+
+    again = requests.get(f"{base_url}/latest", headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_new_rows_invalidate_cache(base_url, writer, make_row):
+    first = requests.get(f"{base_url}/series", params={'city': 'London'})
+    assert len(first.json()) == 24
+
+    writer.write_rows([make_row('London', 24, 40)])
+
+    again = requests.get(
+        f"{base_url}/series", params={'city': 'London'},
+        headers={'If-None-Match': first.headers['ETag']}
+    )
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
+    assert len(again.json()) == 25
+
+
+def test_large_range_is_streamed(base_url, writer, make_row):
+    writer.write_rows([make_row('Paris', m / 60, 15) for m in range(STREAM_THRESHOLD + 10)])
+
+    response = requests.get(f"{base_url}/series", params={'city': 'Paris'})
+    assert response.status_code == 200
+    assert response.headers.get('Transfer-Encoding') == 'chunked'
+
+    rows = response.json()
+    assert len(rows) == STREAM_THRESHOLD + 10
+    assert rows[0]['timestamp'] < rows[-1]['timestamp']
+
+    # Below the threshold the same endpoint answers with a plain body
+    small = requests.get(f"{base_url}/series", params={'city': 'London'})
+    assert 'Content-Length' in small.headers
+
+
+@pytest.mark.parametrize('path, params', [
+    ('/series', {'bucket': '7m'}),
+    ('/aggregate', {'period': 'fortnight'}),
+    ('/series', {'days': 'abc'}),
+    ('/series', {'days': '-2'}),
+    ('/series', {'after_id': 'x'}),
+    ('/aggregate', {'start': 'yesterday'}),
+    ('/series', {'end': '2024-01-01T09:00:00+02:00'}),
+])
+def test_invalid_parameters_are_rejected(base_url, path, params):
+    response = requests.get(f"{base_url}{path}", params=params)
+    assert response.status_code == 400
+    assert 'invalid literal' not in response.json()['error']
+
+
+def test_start_end_accept_dates_and_iso_timestamps(base_url):
+    response = requests.get(f"{base_url}/series", params={
+        'city': 'London', 'start': '2024-01-01T05:00:00', 'end': '2024-01-01 09:00'
+    })
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+    # A date-only end includes the whole day
+    response = requests.get(f"{base_url}/series", params={'city': 'London', 'end': '2024-01-01'})
+    assert len(response.json()) == 24
+
+
+def test_backend_and_internal_errors(server, base_url, monkeypatch):
+    service = server.RequestHandlerClass.service
+
+    def locked(**filters):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(service.storage, 'latest', locked)
+    response = requests.get(f"{base_url}/latest")
+    assert response.status_code == 503
+    assert 'locked' not in response.text
+
+    def broken(params):
+        raise KeyError('oops')
+    monkeypatch.setattr(service, 'aggregate', broken)
+    assert requests.get(f"{base_url}/aggregate").status_code == 500
+
+
+def test_failure_mid_stream_drops_connection(server, base_url, writer, monkeypatch, make_row):
+    writer.write_rows([make_row('Paris', m / 60, 15) for m in range(STREAM_THRESHOLD + 10)])
+    service = server.RequestHandlerClass.service
+
+    def failing(params):
+        yield from service.storage.iter_range(100, city='Paris')
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(service, 'iter_rows', failing)
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        requests.get(f"{base_url}/series", params={'city': 'Paris'})
+
+
+CATALOG_CSV = 'id,name,country,lat,lon,tier,region\n1,London,GB,51.5074,-0.1278,1,Europe\n'
+
+
+def test_map_and_rollup_come_from_the_catalog(tmp_path, writer, make_row):
+    csv_path = tmp_path / 'cities.csv'
+    csv_path.write_text(CATALOG_CSV)
+    catalog = CityCatalog(writer.db_path)
+    catalog.load_csv(str(csv_path))
+    catalog.update_latest([make_row('London', 0, 12.5)])
+
+    server = start_server(get_storage('sqlite', writer.db_path, read_only=True))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        first = requests.get(f"{base_url}/map")
+        assert first.json()[0]['name'] == 'London'
+        assert first.json()[0]['temperature'] == 12.5
+
+        rollup = requests.get(f"{base_url}/rollup", params={'level': 'region'}).json()
+        assert rollup[0]['region'] == 'Europe'
+
+        assert requests.get(f"{base_url}/rollup", params={'level': 'planet'}).status_code == 400
+
+        # city_latest changes without any new weather_history rows
+        catalog.update_latest([make_row('London', 1, 20.0)])
+        again = requests.get(f"{base_url}/map", headers={'If-None-Match': first.headers['ETag']})
+        assert again.status_code == 200
+        assert again.json()[0]['temperature'] == 20.0
+    finally:
+        stop_server(server)
+        catalog.close()
+
+
+def test_catalog_is_opened_on_first_use(tmp_path):
+    pytest.importorskip('duckdb')
+    db_path = str(tmp_path / 'weather.duckdb')
+    # DuckDB keeps its catalog in a sidecar file, which no ETL run has created yet
+    server = start_server(get_storage('duckdb', db_path))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert requests.get(f"{base_url}/map").status_code == 404
+
+        csv_path = tmp_path / 'cities.csv'
+        csv_path.write_text(CATALOG_CSV)
+        catalog = CityCatalog(catalog_db_path('duckdb', db_path))
+        catalog.load_csv(str(csv_path))
+        catalog.close()
+
+        response = requests.get(f"{base_url}/rollup")
+        assert response.status_code == 200
+        assert response.json() == []
+    finally:
+        stop_server(server)
+
+
+def test_unknown_endpoint(base_url):
+    response = requests.get(f"{base_url}/forecast")
+    assert response.status_code == 404
@@ -0,0 +1,106 @@
+# test_catalog.py - Geospatial city catalog
+import random
+
+import pytest
+
+from weather_catalog import CityCatalog, catalog_db_path, haversine_km, tile_region
+
+CSV_HEADER = 'id,name,country,lat,lon,tier,region\n'
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / 'cities.csv'
+    path.write_text(CSV_HEADER + '\n'.join([
+        '1,London,GB,51.5074,-0.1278,1,Europe',
+        '2,Paris,FR,48.8566,2.3522,1,Europe',
+        '3,Lyon,FR,45.7640,4.8357,3,Europe',
+        '4,Suva,FJ,-18.1416,178.4419,3,',
+        '5,Apia,WS,-13.8333,-171.7667,3,Oceania',
+        '6,Nowhere,XX,95.0,0.0,3,',
+    ]) + '\n')
+
+    catalog = CityCatalog(str(tmp_path / 'catalog.db'))
+    catalog.load_csv(str(path))
+    yield catalog
+    catalog.close()
+
+
+def test_load_csv_skips_invalid_rows_and_fills_region(catalog):
+    cities = catalog.cities()
+
+    assert len(cities) == 5
+    assert cities.set_index('name').loc['Suva', 'region'] == tile_region(-18.1416, 178.4419) == '20S 170E'
+    assert list(catalog.cities(max_tier=1)['name']) == ['London', 'Paris']
+
+
+def test_in_bbox(catalog):
+    names = {c['name'] for c in catalog.in_bbox(44, -1, 52, 5)}
+    assert names == {'London', 'Paris', 'Lyon'}
+
+
+def test_in_bbox_wraps_antimeridian(catalog):
+    names = {c['name'] for c in catalog.in_bbox(-25, 170, -10, -170)}
+    assert names == {'Suva', 'Apia'}
+
+
+def test_nearest_across_antimeridian(catalog):
+    result = catalog.nearest(-16.0, -179.0, k=2)
+
+    assert [c['name'] for c in result] == ['Suva', 'Apia']
+    assert result[0]['distance_km'] < result[1]['distance_km']
+
+
+def test_nearest_matches_brute_force(tmp_path):
+    random.seed(7)
+    path = tmp_path / 'random.csv'
+    rows = [f"{i},City{i},XX,{random.uniform(-89, 89):.4f},{random.uniform(-180, 180):.4f},3,"
+            for i in range(1, 2001)]
+    path.write_text(CSV_HEADER + '\n'.join(rows) + '\n')
+
+    catalog = CityCatalog(str(tmp_path / 'random.db'))
+    catalog.load_csv(str(path))
+    cities = catalog.cities()
+
+    for _ in range(25):
+        lat, lon = random.uniform(-85, 85), random.uniform(-180, 180)
+        distances = haversine_km(lat, lon, cities['lat'].to_numpy(), cities['lon'].to_numpy())
+        expected = list(cities['name'].to_numpy()[distances.argsort()[:3]])
+        assert [c['name'] for c in catalog.nearest(lat, lon, k=3)] == expected
+
+    catalog.close()
+
+
+def test_update_latest_and_rollup(catalog):
+    rows = [
+        {'city': 'Paris', 'country': 'FR', 'temperature': 20.0, 'humidity': 50,
+         'dew_point': 9.3, 'wind_speed': 2.0, 'weather_condition': 'Clear',
+         'timestamp': '2024-01-01 12:00:00'},
+        {'city': 'Lyon', 'country': 'FR', 'temperature': 24.0, 'humidity': 40,
+         'wind_speed': 1.0, 'weather_condition': 'Clear', 'timestamp': '2024-01-01 12:00:00'},
+        {'city': 'Atlantis', 'country': 'XX', 'temperature': 0.0, 'humidity': 0,
+         'wind_speed': 0.0, 'weather_condition': 'Clear', 'timestamp': '2024-01-01 12:00:00'},
+    ]
+    assert catalog.update_latest(rows) == 2
+
+    by_country = catalog.rollup('country').set_index('country')
+    assert by_country.loc['FR', 'cities'] == 2
+    assert by_country.loc['FR', 'avg_temperature'] == pytest.approx(22.0)
+
+    map_df = catalog.latest_map()
+    assert set(map_df['name']) == {'Paris', 'Lyon'}
+
+    with pytest.raises(ValueError):
+        catalog.rollup('continent')
+
+
+def test_catalog_follows_storage_settings(monkeypatch):
+    monkeypatch.delenv('WEATHER_CATALOG_DB', raising=False)
+    monkeypatch.setenv('WEATHER_STORAGE', 'duckdb')
+    monkeypatch.setenv('WEATHER_DB_PATH', '/data/weather.duckdb')
+
+    assert catalog_db_path() == '/data/weather_catalog.db'
+    assert catalog_db_path('sqlite', '/data/weather.db') == '/data/weather.db'
+
+    monkeypatch.setenv('WEATHER_CATALOG_DB', '/data/cities.db')
+    assert catalog_db_path() == '/data/cities.db'
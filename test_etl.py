@@ -0,0 +1,62 @@
+# test_etl.py - ETL load step
+import pytest
+
+from weather_catalog import CityCatalog
+from weather_etl import WeatherETL
+from weather_storage import SQLiteStorage
+
+
+class FlakyStorage(SQLiteStorage):
+    """Rejects any write that includes a reading for a rejected city"""
+
+    rejected = {'Atlantis'}
+
+    def write_rows(self, rows):
+        if any(row['city'] in self.rejected for row in rows):
+            raise ValueError("constraint failed")
+        return super().write_rows(rows)
+
+
+@pytest.fixture
+def etl(tmp_path):
+    storage = FlakyStorage(str(tmp_path / 'weather.db'))
+    catalog = CityCatalog(str(tmp_path / 'weather.db'))
+    return WeatherETL('test-key', storage=storage, catalog=catalog, max_tier=1)
+
+
+def test_load_batch_writes_in_one_go(etl, make_row):
+    row_ids = etl.load_batch([make_row('London', 12, 10), make_row('Paris', 12, 12)])
+
+    assert len(row_ids) == 2 and None not in row_ids
+    assert etl.storage.count() == 2
+
+
+def test_failed_record_does_not_drop_the_batch(etl, make_row):
+    row_ids = etl.load_batch([make_row('London', 12, 10), make_row('Atlantis', 12, 0), make_row('Paris', 12, 12)])
+
+    assert row_ids[1] is None
+    assert row_ids[0] is not None and row_ids[2] is not None
+    stored = etl.storage.range_scan()
+    assert sorted(stored['city']) == ['London', 'Paris']
+    # Derived metrics survive the row-by-row fallback
+    assert stored['dew_point'].notna().all()
+
+
+def test_load_data_returns_false_on_failure(etl, make_row):
+    assert etl.load_data(make_row('Atlantis', 12, 0)) is False
+    assert etl.load_data(make_row('London', 12, 10)) == 1
+
+
+def test_unstored_readings_stay_out_of_the_24h_window(etl, make_row):
+    etl.load_batch([make_row('London', 0, 10)])
+
+    etl.storage.rejected = {'London'}
+    assert etl.load_batch([make_row('London', 1, 40)]) == [None]
+
+    etl.storage.rejected = set()
+    etl.load_batch([make_row('London', 2, 10)])
+
+    latest = etl.storage.range_scan(city='London').iloc[-1]
+    assert latest['temperature_mean_24h'] == pytest.approx(10)
+    assert latest['temperature_delta_24h'] == pytest.approx(0)
+    assert list(etl.metrics.windows['London']['temperature']) == [10, 10]
@@ -0,0 +1,54 @@
+# test_metrics.py - Derived metrics engine
+import pytest
+
+from weather_metrics import (
+    DerivedMetrics, dew_point, heat_index, wind_chill, wind_components
+)
+from weather_storage import get_storage
+
+
+def test_point_metrics_match_reference_values():
+    assert dew_point([20.0], [50])[0] == pytest.approx(9.3, abs=0.1)
+    assert heat_index([32.0], [70])[0] == pytest.approx(40.7, abs=0.3)
+    assert heat_index([15.0], [50])[0] == pytest.approx(14.2, abs=0.3)
+    assert wind_chill([-10.0], [20 / 3.6])[0] == pytest.approx(-17.9, abs=0.1)
+    assert wind_chill([20.0], [10.0])[0] == 20.0
+
+
+def test_wind_components_follow_meteorological_convention():
+    u, v = wind_components([10.0, 10.0], [270, 0])
+    # Westerly wind blows east; northerly wind blows south
+    assert u[0] == pytest.approx(10.0)
+    assert v[1] == pytest.approx(-10.0)
+
+
+def test_rolling_metrics_are_incremental(make_row):
+    rows = [make_row('London', h * 2, 10 + h, pressure=1000 + h) for h in range(30)]
+
+    one_shot = DerivedMetrics().enrich(rows)
+    engine = DerivedMetrics()
+    incremental = []
+    for start in range(0, len(rows), 4):
+        incremental += engine.enrich(rows[start:start + 4])
+
+    for expected, actual in zip(one_shot, incremental):
+        for column in ('temperature_delta_24h', 'pressure_delta_24h', 'temperature_mean_24h'):
+            assert actual[column] == pytest.approx(expected[column])
+
+    # Readings every 2h: the oldest reading within 24h is 12 steps back
+    assert one_shot[-1]['temperature_delta_24h'] == pytest.approx(12)
+    assert one_shot[0]['temperature_delta_24h'] is None
+    # Window state only holds the last 24h
+    assert len(engine.windows['London']['seconds']) == 13
+
+
+def test_window_is_seeded_from_storage(tmp_path, make_row):
+    storage = get_storage('sqlite', str(tmp_path / 'weather.db'))
+    history = [make_row('Paris', h, 5 + h) for h in range(24)]
+    storage.write_rows(DerivedMetrics().enrich(history))
+
+    row = DerivedMetrics(storage).enrich([make_row('Paris', 24, 40)])[0]
+    assert row['temperature_delta_24h'] == pytest.approx(40 - 5)
+
+    stored = storage.range_scan(city='Paris')
+    assert stored['dew_point'].notna().all()
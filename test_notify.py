@@ -0,0 +1,116 @@
+# test_notify.py - Change notifications and live chart updates
+import os
+
+import pandas as pd
+import pytest
+
+from weather_notify import UpdateListener, notify_path, publish_update, read_update
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'updates.json')
+
+
+def test_notify_path_follows_storage_settings(monkeypatch, tmp_path):
+    monkeypatch.delenv('WEATHER_NOTIFY_PATH', raising=False)
+    monkeypatch.setenv('WEATHER_STORAGE', 'duckdb')
+    monkeypatch.setenv('WEATHER_DB_PATH', str(tmp_path / 'weather.duckdb'))
+
+    expected = str(tmp_path / 'weather_updates.json')
+    assert notify_path() == expected
+    assert notify_path('sqlite', str(tmp_path / 'weather.db')) == expected
+
+    # Defaults used by the ETL and the dashboards land in the same file
+    publish_update({'London': [1]})
+    publish_update({'London': [2]})
+    assert UpdateListener().path == expected
+    assert read_update()['sequence'] == 2
+
+    monkeypatch.setenv('WEATHER_NOTIFY_PATH', str(tmp_path / 'custom.json'))
+    assert notify_path() == str(tmp_path / 'custom.json')
+
+
+def test_publish_increments_sequence_and_replaces_atomically(path):
+    assert read_update(path) is None
+
+    assert publish_update({'London': [1]}, path) == 1
+    assert publish_update({'Paris': [2, 3]}, path) == 2
+
+    update = read_update(path)
+    assert update['sequence'] == 2
+    assert update['new_ids'] == {'Paris': [2, 3]}
+    # Only the final file is left behind, no temp files
+    assert os.listdir(os.path.dirname(path)) == ['updates.json']
+
+
+def test_listener_ignores_notifications_from_before_it_started(path):
+    publish_update({'London': [1]}, path)
+
+    listener = UpdateListener(path)
+    assert listener.poll() is None
+
+    publish_update({'London': [2]}, path)
+    update = listener.poll()
+    assert update['sequence'] == 2
+    assert update['new_ids'] == {'London': [2]}
+
+
+def test_listener_skips_unchanged_file(path, monkeypatch):
+    listener = UpdateListener(path)
+    assert listener.poll() is None
+
+    publish_update({'London': [1]}, path)
+    assert listener.poll()['sequence'] == 1
+
+    # Same mtime - the file is not read again
+    reads = []
+    monkeypatch.setattr('weather_notify.read_update', lambda p: reads.append(p))
+    assert listener.poll() is None
+    assert reads == []
+
+
+def history(ids, start_temperature=10):
+    return pd.DataFrame({
+        'id': ids,
+        'timestamp': [f"2024-01-01 {i:02d}:00:00" for i in ids],
+        'temperature': [start_temperature + i for i in ids],
+        'humidity': [50 + i for i in ids]
+    })
+
+
+def test_weather_dashboard_appends_only_new_points():
+    dashboard = pytest.importorskip('weather_dashboard')
+
+    charts = {
+        'last_id': 3,
+        'temperature': dashboard.build_trend_figure(history([1, 2, 3]), 'temperature', 't', 'T', 'red'),
+        'humidity': dashboard.build_trend_figure(history([1, 2, 3]), 'humidity', 'h', 'H', 'blue')
+    }
+    # Overlapping rows (ids 2-3) are already on the chart
+    dashboard.append_points(charts, history([2, 3, 4, 5]))
+
+    assert charts['last_id'] == 5
+    assert list(charts['temperature'].data[0].y) == [11, 12, 13, 14, 15]
+    assert list(charts['humidity'].data[0].x)[-1] == '2024-01-01 05:00:00'
+
+
+def test_simple_dashboard_appends_only_new_points():
+    dashboard = pytest.importorskip('simple_dashboard')
+
+    data = history([1, 2, 3])
+    charts = {
+        'last_id': 3,
+        'temperature': dashboard.create_simple_chart(data, 'timestamp', 'temperature', 't', 'red'),
+        'humidity': dashboard.create_simple_chart(data, 'timestamp', 'humidity', 'h', 'blue')
+    }
+    dashboard.append_points(charts, history([3, 4]))
+
+    assert charts['last_id'] == 4
+    lines = charts['temperature'].axes[0].lines
+    # One new segment joined to the previous last point
+    assert len(lines) == 2
+    assert list(lines[-1].get_ydata()) == [13, 14]
+
+    dashboard.append_points(charts, history([4]))
+    assert len(charts['temperature'].axes[0].lines) == 2
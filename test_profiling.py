@@ -0,0 +1,57 @@
+# test_profiling.py - Opt-in render profiling
+import os
+
+import pytest
+
+from weather_profiling import RenderProfiler, section
+
+
+def test_disabled_profiler_records_nothing(monkeypatch):
+    monkeypatch.delenv('WEATHER_PROFILE', raising=False)
+    profiler = RenderProfiler.from_settings(None)
+
+    with profiler:
+        with section('data load'):
+            pass
+
+    assert not profiler.enabled
+    assert profiler.timings == []
+
+
+def test_from_settings_reads_query_value_then_env(monkeypatch):
+    monkeypatch.setenv('WEATHER_PROFILE', 'cprofile')
+
+    assert RenderProfiler.from_settings(None).mode == 'cprofile'
+    assert RenderProfiler.from_settings('1').mode == 'timers'
+    assert RenderProfiler.from_settings('off').mode is None
+
+
+def test_nested_sections_and_report():
+    profiler = RenderProfiler('timers')
+
+    with profiler:
+        with section('data load'):
+            with section('sql'):
+                pass
+        with section('table'):
+            pass
+
+    report = profiler.report()
+    assert list(report['section']) == ['data load', 'data load › sql', 'table', 'other (layout, widgets)']
+    assert list(report['depth']) == [0, 1, 0, 0]
+    assert report.loc[report['depth'] == 0, 'ms'].sum() == pytest.approx(profiler.total_ms, abs=0.05)
+
+    # Sections outside a profiled render are no-ops
+    with section('orphan'):
+        pass
+    assert len(profiler.timings) == 3
+
+
+def test_cprofile_mode_writes_dump(tmp_path):
+    profiler = RenderProfiler('cprofile', name='test', dump_dir=str(tmp_path))
+
+    with profiler:
+        sum(range(1000))
+
+    assert profiler.dump_path.endswith('.prof')
+    assert os.path.exists(profiler.dump_path)
@@ -0,0 +1,221 @@
+# test_storage.py - Conformance tests shared by every storage backend
+import os
+import sys
+import sqlite3
+import subprocess
+
+import pytest
+import pandas as pd
+
+from weather_storage import BACKENDS, get_storage
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def storage(request, tmp_path):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+    storage = get_storage(request.param, str(tmp_path / f"weather.{request.param}"))
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def loaded(storage, make_row):
+    rows = [make_row('London', h, 10 + h) for h in range(48)]
+    rows += [make_row('Paris', h, 20 - h * 0.5, humidity=70) for h in range(48)]
+    storage.write_rows(rows)
+    return storage
+
+
+def test_write_rows_returns_increasing_ids(storage, make_row):
+    ids = storage.write_rows([make_row('London', 0, 10), make_row('Paris', 0, 12)])
+    more = storage.write_rows([make_row('London', 1, 11)])
+
+    assert len(ids) == 2
+    assert ids[0] < ids[1] < more[0]
+
+
+def test_write_rows_empty_batch(storage):
+    assert storage.write_rows([]) == []
+
+
+def test_latest_returns_newest_row_per_city(loaded):
+    df = loaded.latest().set_index('city')
+
+    assert sorted(df.index) == ['London', 'Paris']
+    assert df.loc['London', 'temperature'] == pytest.approx(57)
+    assert df.loc['Paris', 'timestamp'] == '2024-01-02 23:00:00'
+    assert 'id' in df.columns
+
+
+def test_range_scan_filters(loaded):
+    df = loaded.range_scan(city='London', start='2024-01-01 10:00:00', end='2024-01-01 19:00:00')
+
+    assert len(df) == 10
+    assert set(df['city']) == {'London'}
+    assert list(df['timestamp']) == sorted(df['timestamp'])
+
+
+def test_range_scan_after_id(loaded, make_row):
+    last_id = int(loaded.range_scan(city='Paris')['id'].max())
+    loaded.write_rows([make_row('Paris', 48, 0)])
+
+    df = loaded.range_scan(city='Paris', after_id=last_id)
+    assert len(df) == 1
+    assert df['temperature'].iloc[0] == pytest.approx(0)
+
+
+def test_range_scan_bucket_downsamples(loaded):
+    df = loaded.range_scan(city='London', bucket=6 * 3600)
+
+    assert len(df) == 8
+    assert df['samples'].tolist() == [6] * 8
+    assert df['temperature'].iloc[0] == pytest.approx(12.5)
+    assert df['timestamp'].iloc[1] == '2024-01-01 06:00:00'
+
+
+def test_iter_range_batches_cover_range(loaded):
+    batches = list(loaded.iter_range(batch_size=20, city='London'))
+
+    assert [len(batch) for batch in batches] == [20, 20, 8]
+    assert sum(len(batch) for batch in batches) == loaded.count(city='London')
+
+
+def test_iter_range_pages_across_equal_timestamps(loaded):
+    # London and Paris share every timestamp, so pages split ties
+    rows = pd.concat(loaded.iter_range(batch_size=7))
+
+    assert len(rows) == 96
+    assert rows['id'].is_unique
+    assert list(rows['timestamp']) == sorted(rows['timestamp'])
+
+
+def test_count_stops_at_limit(loaded):
+    assert loaded.count(limit=10) == 10
+    assert loaded.count(limit=100, city='London') == 48
+
+
+def test_aggregate_by_day(loaded):
+    df = loaded.aggregate('day', city='London')
+
+    assert df['period'].tolist() == ['2024-01-01', '2024-01-02']
+    assert df['records'].tolist() == [24, 24]
+    assert df['min_temperature'].iloc[0] == pytest.approx(10)
+    assert df['max_temperature'].iloc[1] == pytest.approx(57)
+    assert df['avg_temperature'].iloc[0] == pytest.approx(21.5)
+
+
+def test_aggregate_rejects_unknown_period(loaded):
+    with pytest.raises(ValueError):
+        loaded.aggregate('fortnight')
+
+
+def test_data_version_changes_on_write(loaded, make_row):
+    before = loaded.data_version()
+    loaded.write_rows([make_row('London', 100, 5)])
+    assert loaded.data_version() != before
+
+
+def test_read_only_storage_reads_and_rejects_writes(loaded, make_row):
+    reader = get_storage(loaded.name, loaded.db_path, read_only=True)
+    try:
+        assert reader.count() == 96
+        with pytest.raises(PermissionError):
+            reader.write_rows([make_row('London', 200, 1)])
+    finally:
+        reader.close()
+
+
+def test_derived_columns_round_trip(storage, make_row):
+    row = make_row('London', 0, 10)
+    row.update({'dew_point': 4.5, 'temperature_delta_24h': None})
+    storage.write_rows([row])
+
+    stored = storage.range_scan().iloc[0]
+    assert stored['dew_point'] == pytest.approx(4.5)
+    assert pd.isna(stored['temperature_delta_24h'])
+    assert storage.aggregate('day')['avg_dew_point'].iloc[0] == pytest.approx(4.5)
+
+
+def test_read_only_reader_on_database_without_derived_columns(tmp_path, make_row):
+    db_path = str(tmp_path / 'old.db')
+    base_columns = list(make_row('London', 0, 10))
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE weather_history (id INTEGER PRIMARY KEY AUTOINCREMENT, {', '.join(base_columns)})")
+    conn.execute(
+        f"INSERT INTO weather_history ({', '.join(base_columns)}) VALUES ({', '.join('?' * len(base_columns))})",
+        tuple(make_row('London', 0, 10).values())
+    )
+    conn.commit()
+    conn.close()
+
+    reader = get_storage('sqlite', db_path, read_only=True)
+    try:
+        assert reader.aggregate('day')['avg_temperature'].iloc[0] == pytest.approx(10)
+        assert pd.isna(reader.range_scan(bucket=3600)['dew_point'].iloc[0])
+
+        # Once a writer has migrated the table the same reader picks the columns up
+        writer = get_storage('sqlite', db_path)
+        row = make_row('London', 1, 12)
+        row['dew_point'] = 3.0
+        writer.write_rows([row])
+        assert reader.aggregate('day')['avg_dew_point'].iloc[0] == pytest.approx(3.0)
+    finally:
+        reader.close()
+
+
+# Opens the storage read-only in another process and holds a connection
+HOLD_READER = """
+import sys, time
+from weather_storage import get_storage
+storage = get_storage(sys.argv[1], sys.argv[2], read_only=True)
+with storage._connection():
+    print('ready', flush=True)
+    time.sleep(float(sys.argv[3]))
+"""
+
+# Writes one row from another process
+WRITE_ROW = """
+import sys
+from weather_storage import get_storage
+from conftest import build_row
+print(get_storage(sys.argv[1], sys.argv[2]).write_rows([build_row('Paris', 500, 1)])[0])
+"""
+
+
+def run_python(script, *args, **kwargs):
+    return subprocess.Popen(
+        [sys.executable, '-c', script, *map(str, args)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE, text=True, **kwargs
+    )
+
+
+def test_write_waits_for_reader_in_another_process(loaded, make_row):
+    reader = run_python(HOLD_READER, loaded.name, loaded.db_path, 1.0)
+    try:
+        assert reader.stdout.readline().strip() == 'ready'
+        ids = loaded.write_rows([make_row('London', 300, 5)])
+    finally:
+        reader.wait(timeout=30)
+
+    assert len(ids) == 1
+    assert loaded.count() == 97
+
+
+def test_streaming_reader_does_not_block_writers(loaded):
+    reader = get_storage(loaded.name, loaded.db_path, read_only=True)
+    try:
+        batches = reader.iter_range(batch_size=40)
+        first = next(batches)
+
+        # Another process writes while this read is still in progress
+        writer = run_python(WRITE_ROW, loaded.name, loaded.db_path)
+        output, _ = writer.communicate(timeout=60)
+        assert writer.returncode == 0 and output.strip()
+
+        rest = list(batches)
+    finally:
+        reader.close()
+
+    assert len(first) + sum(len(batch) for batch in rest) in (96, 97)
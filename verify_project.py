@@ -6,6 +6,14 @@ required_files = [
     'weather_dashboard.py', 
     'weather_scheduler.py',
     'simple_dashboard.py',
+    'weather_api.py',
+    'weather_notify.py',
+    'weather_storage.py',
+    'weather_metrics.py',
+    'weather_catalog.py',
+    'weather_profiling.py',
+    'load_test.py',
+    'cities.csv',
     'requirements.txt',
     '.gitignore',
     'README.md'
@@ -0,0 +1,423 @@
+# weather_api.py - Read-only Weather Query Service
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import traceback
+from datetime import date, datetime, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from weather_storage import PERIODS, TIMESTAMP_FORMAT, get_storage
+from weather_catalog import ROLLUP_LEVELS, CityCatalog, catalog_db_path
+
+# Rows per chunk when streaming large ranges
+STREAM_BATCH_SIZE = 500
+
+# Raw series larger than this are streamed instead of cached
+STREAM_THRESHOLD = 2000
+
+# Downsampling bucket sizes accepted by /series
+BUCKETS = {
+    '15m': 900,
+    '1h': 3600,
+    '3h': 10800,
+    '6h': 21600,
+    '1d': 86400
+}
+
+# Query parameters passed through to the storage range filters
+FILTERS = ('city', 'start', 'end', 'days', 'after_id')
+
+
+class QueryError(ValueError):
+    """Raised for invalid query parameters (HTTP 400)"""
+
+
+class CatalogMissing(LookupError):
+    """Raised when map endpoints are called without a city catalog (HTTP 404)"""
+
+
+class ResultCache:
+    """Shared result cache keyed by (data version, query)
+
+    Entries for older versions are never served again once a load bumps
+    the version; they simply age out. Keying by version rather than
+    clearing on change means a request that read the version just before
+    a load cannot wipe results already cached for the newer one.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            return self._entries.get((version, key))
+
+    def put(self, key, version, value):
+        with self._lock:
+            if (version, key) not in self._entries and len(self._entries) >= self.max_entries:
+                # Oldest first - stale versions are the first to go
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[(version, key)] = value
+
+
+class WeatherQueryService:
+    """Query layer shared by all HTTP handler threads"""
+
+    def __init__(self, storage, catalog=None):
+        self.storage = storage
+        self.cache = ResultCache()
+        self.catalog = None
+        self._catalog_lock = threading.Lock()
+        if catalog is not None:
+            self._use_catalog(catalog)
+
+        # The city catalog is always SQLite, whatever the history backend
+        self.errors = storage.errors + (sqlite3.Error,)
+
+    def data_version(self):
+        return self.storage.data_version()
+
+    @staticmethod
+    def etag(key, version):
+        digest = hashlib.sha1(f"{version}:{key}".encode()).hexdigest()
+        return f'"{digest[:16]}"'
+
+    def latest(self):
+        """Latest reading for each city"""
+        return self.storage.latest()
+
+    def series(self, params):
+        """City time series, downsampled when a bucket is given"""
+        bucket = params.get('bucket')
+        if bucket is not None and bucket not in BUCKETS:
+            raise QueryError(f"bucket must be one of {', '.join(BUCKETS)}")
+        return self.storage.range_scan(bucket=BUCKETS.get(bucket), **self.filters(params))
+
+    def aggregate(self, params):
+        """Temperature/humidity aggregates grouped by period (and city)"""
+        period = params.get('period', 'day')
+        if period not in PERIODS:
+            raise QueryError(f"period must be one of {', '.join(PERIODS)}")
+        return self.storage.aggregate(period, **self.filters(params))
+
+    def city_map(self):
+        """Latest reading per catalog city with coordinates"""
+        return self.require_catalog().latest_map()
+
+    def rollup(self, params):
+        """Latest conditions aggregated per country, region or tier"""
+        level = params.get('level', 'country')
+        if level not in ROLLUP_LEVELS:
+            raise QueryError(f"level must be one of {', '.join(ROLLUP_LEVELS)}")
+        return self.require_catalog().rollup(level)
+
+    def catalog_version(self):
+        """Version for map results, which change without new history rows
+
+        The ETL updates city_latest after writing history, and CSV reloads
+        touch only the catalog, so weather_history's version would miss
+        both. The open token keeps ETags from colliding across restarts,
+        since PRAGMA data_version restarts with each connection.
+        """
+        catalog = self.require_catalog()
+        return f"catalog-{self._catalog_token}-{catalog.data_version()}"
+
+    def require_catalog(self):
+        """The catalog, opened on first use so a later first ETL run is picked up"""
+        if self.catalog is None:
+            with self._catalog_lock:
+                if self.catalog is None:
+                    catalog = open_catalog(self.storage)
+                    if catalog is not None:
+                        self._use_catalog(catalog)
+        if self.catalog is None:
+            raise CatalogMissing("City catalog is not loaded")
+        return self.catalog
+
+    def _use_catalog(self, catalog):
+        self._catalog_token = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        self.catalog = catalog
+
+    def is_large(self, params):
+        """Raw series too big to cache are streamed instead"""
+        if params.get('bucket') is not None:
+            return False
+        # Only probe one row past the threshold rather than counting the whole range
+        return self.storage.count(limit=STREAM_THRESHOLD + 1, **self.filters(params)) > STREAM_THRESHOLD
+
+    def iter_rows(self, params):
+        """Yield row batches so large ranges never sit fully in memory"""
+        return self.storage.iter_range(STREAM_BATCH_SIZE, **self.filters(params))
+
+    @staticmethod
+    def parse_timestamp(key, value):
+        """Normalize a start/end bound to the stored timestamp format
+
+        A date on its own covers the whole day, so end=2024-01-31 includes
+        every reading on the 31st. Stored timestamps carry no timezone, so
+        values with an offset are rejected rather than silently shifted.
+        """
+        try:
+            day = date.fromisoformat(value)
+        except ValueError:
+            day = None
+        if day is not None:
+            bound = time.max if key == 'end' else time.min
+            return datetime.combine(day, bound).strftime(TIMESTAMP_FORMAT)
+
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise QueryError(f"{key} must be a date or timestamp like 2024-01-31 12:00:00") from None
+        if parsed.tzinfo is not None:
+            raise QueryError(f"{key} must not include a timezone offset - timestamps are stored as local time")
+        return parsed.strftime(TIMESTAMP_FORMAT)
+
+    @staticmethod
+    def filters(params):
+        """Validated storage filters from the query string"""
+        filters = {key: params[key] for key in FILTERS if params.get(key)}
+
+        for key, minimum in (('days', 1), ('after_id', 0)):
+            if key in filters:
+                try:
+                    filters[key] = int(filters[key])
+                except ValueError:
+                    raise QueryError(f"{key} must be an integer") from None
+                if filters[key] < minimum:
+                    raise QueryError(f"{key} must be at least {minimum}")
+
+        for key in ('start', 'end'):
+            if key in filters:
+                filters[key] = WeatherQueryService.parse_timestamp(key, filters[key])
+
+        return filters
+
+
+class WeatherRequestHandler(BaseHTTPRequestHandler):
+    """HTTP/JSON endpoints: /latest, /series, /aggregate, /map, /rollup"""
+
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        routes = {
+            '/latest': self.handle_latest,
+            '/series': self.handle_series,
+            '/aggregate': self.handle_aggregate,
+            '/map': self.handle_map,
+            '/rollup': self.handle_rollup
+        }
+
+        handler = routes.get(url.path.rstrip('/') or '/')
+        if handler is None:
+            self.send_json({'error': f"Unknown endpoint {url.path}"}, status=404)
+            return
+
+        self.streaming = False
+        try:
+            handler(params)
+        except QueryError as e:
+            self.send_error_json(400, str(e))
+        except CatalogMissing as e:
+            self.send_error_json(404, str(e))
+        except self.service.errors as e:
+            print(f"❌ Database error for {self.path}: {e}")
+            self.send_error_json(503, "Database unavailable")
+        except ConnectionError:
+            # Client went away mid-response
+            self.close_connection = True
+        except Exception:
+            traceback.print_exc()
+            self.send_error_json(500, "Internal server error")
+
+    def handle_latest(self, params):
+        self.send_cached('latest', lambda: self.service.latest())
+
+    def handle_aggregate(self, params):
+        key = 'aggregate?' + json.dumps(params, sort_keys=True)
+        self.send_cached(key, lambda: self.service.aggregate(params))
+
+    def handle_map(self, params):
+        self.send_cached('map', lambda: self.service.city_map(), self.service.catalog_version)
+
+    def handle_rollup(self, params):
+        key = 'rollup?' + json.dumps(params, sort_keys=True)
+        self.send_cached(key, lambda: self.service.rollup(params), self.service.catalog_version)
+
+    def handle_series(self, params):
+        key = 'series?' + json.dumps(params, sort_keys=True)
+        version = self.service.data_version()
+        etag = self.service.etag(key, version)
+        if self.not_modified(etag):
+            return
+
+        body = self.service.cache.get(key, version)
+        if body is None:
+            # Only a cache miss needs the size probe - cached series are small
+            if self.service.is_large(params):
+                self.send_stream(self.service.iter_rows(params), etag)
+                return
+            body = self.build_body(key, version, lambda: self.service.series(params))
+
+        self.send_body(body, etag)
+
+    def send_cached(self, key, compute, version=None):
+        """Serve from the shared cache, honouring If-None-Match
+
+        version: callable giving the data version the result depends on,
+        weather_history's by default
+        """
+        version = (version or self.service.data_version)()
+        etag = self.service.etag(key, version)
+        if self.not_modified(etag):
+            return
+
+        body = self.service.cache.get(key, version)
+        if body is None:
+            body = self.build_body(key, version, compute)
+
+        self.send_body(body, etag)
+
+    def build_body(self, key, version, compute):
+        body = compute().to_json(orient='records').encode()
+        self.service.cache.put(key, version, body)
+        return body
+
+    def send_body(self, body, etag):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, batches, etag):
+        """Write a JSON array using chunked transfer encoding"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.streaming = True
+
+        self.write_chunk(b'[')
+        first = True
+        for batch in batches:
+            # Strip the array brackets so batches join into one array
+            payload = batch.to_json(orient='records')[1:-1]
+            self.write_chunk((payload if first else ',' + payload).encode())
+            first = False
+        self.write_chunk(b']')
+        self.write_chunk(b'')
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def not_modified(self, etag):
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return True
+        return False
+
+    def send_error_json(self, status, message):
+        if self.streaming:
+            # Headers already went out - drop the connection so the client
+            # sees a truncated body instead of a second status line
+            self.close_connection = True
+            return
+        self.send_json({'error': message}, status=status)
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def open_catalog(storage):
+    """Read-only catalog for a storage backend, or None if it was never created"""
+    path = catalog_db_path(storage.name, storage.db_path)
+    if not os.path.exists(path):
+        return None
+
+    catalog = CityCatalog(path, read_only=True)
+    if not catalog.is_loaded():
+        catalog.close()
+        return None
+    return catalog
+
+
+def create_server(host='127.0.0.1', port=8765, storage=None, catalog=None):
+    """Build a threaded HTTP server bound to a shared query service
+
+    The catalog is opened on the first /map or /rollup request unless one
+    is passed in.
+    """
+    storage = storage or get_storage(read_only=True)
+    handler = type('Handler', (WeatherRequestHandler,), {
+        'service': WeatherQueryService(storage, catalog)
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def fetch_series(base_url, **params):
+    """Fetch raw /series rows matching the given filters"""
+    response = requests.get(f"{base_url.rstrip('/')}/series", params=params, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def load_from_api(base_url, days=3):
+    """Fetch (latest, historical) DataFrames from the query service"""
+    import pandas as pd
+
+    latest = requests.get(f"{base_url.rstrip('/')}/latest", timeout=10)
+    latest.raise_for_status()
+    historical = fetch_series(base_url, days=days)
+
+    return pd.DataFrame(latest.json()), pd.DataFrame(historical)
+
+
+def load_map_from_api(base_url, level='country'):
+    """Fetch (city map, rollup) DataFrames from the query service"""
+    import pandas as pd
+
+    city_map = requests.get(f"{base_url.rstrip('/')}/map", timeout=10)
+    city_map.raise_for_status()
+    rollup = requests.get(f"{base_url.rstrip('/')}/rollup", params={'level': level}, timeout=10)
+    rollup.raise_for_status()
+
+    return pd.DataFrame(city_map.json()), pd.DataFrame(rollup.json())
+
+
+if __name__ == "__main__":
+    host = os.environ.get('WEATHER_API_HOST', '127.0.0.1')
+    port = int(os.environ.get('WEATHER_API_PORT', '8765'))
+
+    server = create_server(host, port)
+    print(f"🌐 Weather query service running on http://{host}:{port}")
+    print("📍 Endpoints: /latest, /series, /aggregate, /map, /rollup")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Query service stopped by user")
+        server.server_close()
@@ -0,0 +1,334 @@
+# weather_catalog.py - Geospatial City Catalog
+import os
+import csv
+import math
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from weather_storage import storage_settings
+
+CATALOG_CSV_PATH = 'cities.csv'
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Size of the lat/lon tiles used as the region when the file gives none
+TILE_DEGREES = 10
+
+# Columns a rollup can group by
+ROLLUP_LEVELS = ('country', 'region', 'tier')
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; works on scalars or NumPy arrays"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def catalog_db_path(backend=None, db_path=None):
+    """SQLite file holding the catalog for a storage backend
+
+    With SQLite storage the catalog shares the weather database; other
+    backends get a sidecar file next to theirs, since the spatial index
+    needs SQLite's R-tree. WEATHER_CATALOG_DB overrides both.
+    """
+    override = os.environ.get('WEATHER_CATALOG_DB')
+    if override:
+        return override
+
+    backend, db_path = storage_settings(backend, db_path)
+    if backend == 'sqlite':
+        return db_path
+    return f"{os.path.splitext(db_path)[0]}_catalog.db"
+
+
+def tile_region(lat, lon):
+    """Name of the TILE_DEGREES tile containing a point, e.g. '50N 0E'"""
+    lat_tile = math.floor(lat / TILE_DEGREES) * TILE_DEGREES
+    lon_tile = math.floor(lon / TILE_DEGREES) * TILE_DEGREES
+    return f"{abs(lat_tile)}{'N' if lat_tile >= 0 else 'S'} {abs(lon_tile)}{'E' if lon_tile >= 0 else 'W'}"
+
+
+class CityCatalog:
+    """City metadata with a spatial index and per-city latest readings
+
+    Bounding boxes and nearest-city lookups go through SQLite's R-tree
+    module (falling back to a (lat, lon) B-tree index where the module is
+    not compiled in). city_latest holds one row per city, kept up to date
+    by the ETL, so map views and rollups never scan weather_history.
+    """
+
+    def __init__(self, db_path=None, read_only=False):
+        self.db_path = db_path = db_path or catalog_db_path()
+        self.read_only = read_only
+        self._lock = threading.Lock()
+
+        if read_only:
+            self.conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._create_schema()
+
+        self.has_rtree = self._table_exists('city_rtree')
+
+    def _create_schema(self):
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS city_catalog (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            country TEXT,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            tier INTEGER DEFAULT 3,
+            region TEXT
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_city_catalog_name ON city_catalog(name, country)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_city_catalog_lat_lon ON city_catalog(lat, lon)')
+
+        try:
+            self.conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS city_rtree
+            USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"⚠️  R-tree module unavailable, using lat/lon index instead: {e}")
+
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS city_latest (
+            city_id INTEGER PRIMARY KEY,
+            temperature REAL,
+            humidity REAL,
+            dew_point REAL,
+            wind_speed REAL,
+            weather_condition TEXT,
+            timestamp TEXT
+        )
+        ''')
+        self.conn.commit()
+
+    def _table_exists(self, name):
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def load_csv(self, path=CATALOG_CSV_PATH):
+        """Bulk load (or refresh) cities from a CSV with id,name,country,lat,lon,tier[,region]"""
+        records, skipped = [], 0
+        next_id = (self.conn.execute('SELECT MAX(id) FROM city_catalog').fetchone()[0] or 0) + 1
+
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    lat, lon = float(row['lat']), float(row['lon'])
+                    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                        raise ValueError("coordinates out of range")
+                    if row.get('id'):
+                        city_id = int(row['id'])
+                    else:
+                        city_id, next_id = next_id, next_id + 1
+                    records.append((
+                        city_id,
+                        row['name'].strip(),
+                        (row.get('country') or '').strip() or None,
+                        lat,
+                        lon,
+                        int(row.get('tier') or 3),
+                        (row.get('region') or '').strip() or tile_region(lat, lon)
+                    ))
+                except (KeyError, ValueError) as e:
+                    skipped += 1
+                    print(f"⚠️  Skipping catalog row {row}: {e}")
+
+        with self._lock:
+            self.conn.executemany('''
+            INSERT OR REPLACE INTO city_catalog (id, name, country, lat, lon, tier, region)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', records)
+            if self.has_rtree:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO city_rtree VALUES (?, ?, ?, ?, ?)',
+                    [(r[0], r[3], r[3], r[4], r[4]) for r in records]
+                )
+            self.conn.commit()
+
+        print(f"🗺️  Loaded {len(records)} cities into catalog ({skipped} skipped)")
+        return len(records)
+
+    def is_loaded(self):
+        """True once the catalog tables exist in the file"""
+        with self._lock:
+            return self._table_exists('city_catalog')
+
+    def data_version(self):
+        """Changes whenever another connection commits to the catalog file
+
+        Covers both city_latest updates from the ETL and CSV reloads. The
+        value is only comparable across calls on this same connection.
+        """
+        with self._lock:
+            return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM city_catalog').fetchone()[0]
+
+    def cities(self, max_tier=None, country=None):
+        """Catalog rows ordered by tier, optionally filtered"""
+        clauses, args = [], []
+        if max_tier is not None:
+            clauses.append('tier <= ?')
+            args.append(int(max_tier))
+        if country:
+            clauses.append('country = ?')
+            args.append(country)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT * FROM city_catalog {where} ORDER BY tier, id", self.conn, params=args
+            )
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Cities inside a bounding box; min_lon > max_lon wraps the antimeridian"""
+        if min_lon <= max_lon:
+            ranges = [(min_lon, max_lon)]
+        else:
+            ranges = [(min_lon, 180.0), (-180.0, max_lon)]
+
+        results = []
+        with self._lock:
+            for lon_lo, lon_hi in ranges:
+                results += self._bbox_rows(min_lat, max_lat, lon_lo, lon_hi)
+        return results
+
+    def nearest(self, lat, lon, k=1):
+        """The k closest cities, each with a distance_km key
+
+        Searches a box around the point and widens it until the k-th
+        candidate is closer than the box edge, so only nearby index pages
+        are read.
+        """
+        radius = 2.0
+        while True:
+            lat_lo, lat_hi = max(lat - radius, -90.0), min(lat + radius, 90.0)
+            widest = max(abs(lat_lo), abs(lat_hi))
+            lon_radius = radius / max(math.cos(math.radians(widest)), 1e-6)
+            covers_all = radius >= 180
+
+            if covers_all or lon_radius >= 180:
+                lon_lo, lon_hi = -180.0, 180.0
+            else:
+                lon_lo = (lon - lon_radius + 180) % 360 - 180
+                lon_hi = (lon + lon_radius + 180) % 360 - 180
+
+            candidates = self.in_bbox(lat_lo, lon_lo, lat_hi, lon_hi)
+            if candidates:
+                distances = haversine_km(
+                    lat, lon,
+                    np.array([c['lat'] for c in candidates]),
+                    np.array([c['lon'] for c in candidates])
+                )
+                order = np.argsort(distances)[:k]
+                # Anything closer than the box edge must already be inside the box
+                if covers_all or (len(order) == k and distances[order[-1]] <= radius * KM_PER_DEGREE):
+                    return [dict(candidates[i], distance_km=float(distances[i])) for i in order]
+            elif covers_all:
+                return []
+
+            radius *= 4
+
+    def update_latest(self, rows):
+        """Record the newest reading for each catalog city in a loaded batch"""
+        with self._lock:
+            ids = {}
+            for name, country, city_id in self.conn.execute('SELECT name, country, id FROM city_catalog'):
+                ids.setdefault((name, country), city_id)
+                ids.setdefault((name, None), city_id)
+
+            records = []
+            for row in rows:
+                city_id = ids.get((row['city'], row.get('country'))) or ids.get((row['city'], None))
+                if city_id is not None:
+                    records.append((
+                        city_id, row['temperature'], row['humidity'], row.get('dew_point'),
+                        row['wind_speed'], row['weather_condition'], row['timestamp']
+                    ))
+
+            self.conn.executemany('''
+            INSERT OR REPLACE INTO city_latest
+            (city_id, temperature, humidity, dew_point, wind_speed, weather_condition, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', records)
+            self.conn.commit()
+        return len(records)
+
+    def latest_map(self):
+        """Latest reading per city with coordinates, ready for a map view"""
+        with self._lock:
+            return pd.read_sql_query('''
+            SELECT c.id, c.name, c.country, c.lat, c.lon, c.tier, c.region,
+                   l.temperature, l.humidity, l.dew_point, l.wind_speed,
+                   l.weather_condition, l.timestamp
+            FROM city_latest l
+            JOIN city_catalog c ON c.id = l.city_id
+            ORDER BY c.tier, c.id
+            ''', self.conn)
+
+    def rollup(self, level='country'):
+        """Latest conditions aggregated per country, region or tier"""
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"level must be one of {', '.join(ROLLUP_LEVELS)}")
+
+        with self._lock:
+            return pd.read_sql_query(f'''
+            SELECT c.{level} as {level},
+                   COUNT(*) as cities,
+                   AVG(l.temperature) as avg_temperature,
+                   MIN(l.temperature) as min_temperature,
+                   MAX(l.temperature) as max_temperature,
+                   AVG(l.humidity) as avg_humidity,
+                   AVG(l.dew_point) as avg_dew_point,
+                   AVG(c.lat) as lat,
+                   AVG(c.lon) as lon,
+                   MAX(l.timestamp) as last_update
+            FROM city_latest l
+            JOIN city_catalog c ON c.id = l.city_id
+            GROUP BY c.{level}
+            ORDER BY avg_temperature DESC
+            ''', self.conn)
+
+    def close(self):
+        self.conn.close()
+
+    def _bbox_rows(self, lat_lo, lat_hi, lon_lo, lon_hi):
+        if self.has_rtree:
+            query = '''
+            SELECT c.id, c.name, c.country, c.lat, c.lon, c.tier, c.region
+            FROM city_rtree r
+            JOIN city_catalog c ON c.id = r.id
+            WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+            '''
+        else:
+            query = '''
+            SELECT id, name, country, lat, lon, tier, region
+            FROM city_catalog
+            WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?
+            '''
+        cursor = self.conn.execute(query, (lat_lo, lat_hi, lon_lo, lon_hi))
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+
+if __name__ == "__main__":
+    import sys
+
+    catalog = CityCatalog()
+    catalog.load_csv(sys.argv[1] if len(sys.argv) > 1 else CATALOG_CSV_PATH)
+    print(f"📍 Catalog now holds {catalog.count()} cities")
@@ -1,10 +1,21 @@
 # weather_dashboard.py - Interactive Weather Dashboard
 import streamlit as st
 import pandas as pd
-import sqlite3
+import os
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from weather_api import load_from_api, load_map_from_api, fetch_series
+from weather_notify import UpdateListener
+from weather_storage import get_storage
+from weather_catalog import CityCatalog, catalog_db_path
+from weather_profiling import RenderProfiler, section
+
+# Point the dashboard at the query service instead of opening SQLite directly
+API_URL = os.environ.get('WEATHER_API_URL')
+
+# How often the live trends fragment checks for new ETL loads
+REFRESH_SECONDS = 30
 
 # Page configuration
 st.set_page_config(
@@ -37,32 +48,44 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_weather_data():
-    """Load data from SQLite database"""
+@st.cache_resource
+def get_reader():
+    """Read-only storage handle shared by all sessions"""
+    return get_storage(read_only=True)
+
+@st.cache_resource
+def get_catalog():
+    """Read-only city catalog shared by all sessions"""
+    reader = get_reader()
+    return CityCatalog(catalog_db_path(reader.name, reader.db_path), read_only=True)
+
+def load_map_data(level):
+    """Latest reading per catalog city and a rollup, without touching raw history"""
     try:
-        conn = sqlite3.connect('weather_data.db')
-        
-        # Get latest data for each city
-        latest_query = """
-        SELECT wh1.* FROM weather_history wh1
-        INNER JOIN (
-            SELECT city, MAX(timestamp) as max_timestamp 
-            FROM weather_history 
-            GROUP BY city
-        ) wh2 ON wh1.city = wh2.city AND wh1.timestamp = wh2.max_timestamp
-        """
-        
-        df_latest = pd.read_sql_query(latest_query, conn)
+        if API_URL:
+            return load_map_from_api(API_URL, level)
         
-        # Get historical data for charts (last 3 days)
-        historical_query = """
-        SELECT * FROM weather_history 
-        WHERE timestamp >= datetime('now', '-3 days')
-        ORDER BY timestamp
-        """
+        catalog = get_catalog()
+        return catalog.latest_map(), catalog.rollup(level)
+    except Exception:
+        # Catalog not loaded yet - the map section is simply skipped
+        return pd.DataFrame(), pd.DataFrame()
+
+def load_weather_data():
+    """Load data from the query service, or the configured storage backend"""
+    if API_URL:
+        try:
+            return load_from_api(API_URL, days=3)
+        except Exception as e:
+            st.error(f"Query service error: {e}")
+            return pd.DataFrame(), pd.DataFrame()
+    
+    try:
+        storage = get_reader()
         
-        df_historical = pd.read_sql_query(historical_query, conn)
-        conn.close()
+        # Latest data for each city, plus the last 3 days for charts
+        df_latest = storage.latest()
+        df_historical = storage.range_scan(days=3)
         
         return df_latest, df_historical
         
@@ -70,7 +93,92 @@ def load_weather_data():
         st.error(f"Database error: {e}")
         return pd.DataFrame(), pd.DataFrame()
 
-def main():
+def has_derived_metrics(df):
+    """True once the ETL has stored derived metric columns"""
+    return 'dew_point' in df.columns and df['dew_point'].notna().any()
+
+def load_new_rows(city, after_id):
+    """Load only the rows added for a city since the last chart update"""
+    if API_URL:
+        return pd.DataFrame(fetch_series(API_URL, city=city, after_id=after_id))
+    
+    return get_reader().range_scan(city=city, after_id=after_id)
+
+def build_trend_figure(data, y_col, title, label, color):
+    """Create a single-trace line chart for one metric"""
+    fig = px.line(
+        data, 
+        x='timestamp', 
+        y=y_col,
+        title=title,
+        labels={y_col: label, 'timestamp': 'Time'}
+    )
+    fig.update_traces(line=dict(color=color, width=3))
+    return fig
+
+def append_points(charts, new_rows):
+    """Extend the existing trend figures in place instead of rebuilding them"""
+    new_rows = new_rows[new_rows['id'] > charts['last_id']]
+    if new_rows.empty:
+        return
+    
+    for y_col in ('temperature', 'humidity'):
+        trace = charts[y_col].data[0]
+        trace.x = tuple(trace.x) + tuple(new_rows['timestamp'])
+        trace.y = tuple(trace.y) + tuple(new_rows[y_col])
+    
+    charts['last_id'] = int(new_rows['id'].max())
+
+def get_live_charts(selected_city, city_historical):
+    """Trend figures for a city, kept in session state between reruns"""
+    live_charts = st.session_state.setdefault('live_charts', {})
+    
+    if selected_city not in live_charts:
+        live_charts[selected_city] = {
+            'last_id': int(city_historical['id'].max()),
+            'temperature': build_trend_figure(
+                city_historical, 'temperature',
+                f'🌡️ Temperature Trend in {selected_city}', 'Temperature (°C)', 'red'
+            ),
+            'humidity': build_trend_figure(
+                city_historical, 'humidity',
+                f'💧 Humidity Trend in {selected_city}', 'Humidity (%)', 'blue'
+            )
+        }
+    else:
+        # Full rerun - only add rows the figures haven't seen yet
+        append_points(live_charts[selected_city], city_historical)
+    
+    return live_charts[selected_city]
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_trends(selected_city, city_historical):
+    """Trend charts that pick up new ETL loads without rerunning the page"""
+    charts = get_live_charts(selected_city, city_historical)
+    
+    if 'update_listener' not in st.session_state:
+        st.session_state['update_listener'] = UpdateListener()
+    listener = st.session_state['update_listener']
+    update = listener.poll()
+    
+    if update and max(update['new_ids'].get(selected_city, [0])) > charts['last_id']:
+        try:
+            append_points(charts, load_new_rows(selected_city, charts['last_id']))
+        except Exception as e:
+            st.error(f"Live update error: {e}")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.plotly_chart(charts['temperature'], use_container_width=True)
+        
+    with col2:
+        st.plotly_chart(charts['humidity'], use_container_width=True)
+    
+    if update:
+        st.caption(f"🔄 Live update received at {update['timestamp']}")
+
+def render_dashboard():
     # Header
     st.markdown('<h1 class="main-header">🌤️ Real-time Weather Analytics Dashboard</h1>', 
                 unsafe_allow_html=True)
@@ -78,7 +186,8 @@ def main():
     st.markdown("### Live weather data from major cities worldwide • Updated every 2 hours")
     
     # Load data
-    df_latest, df_historical = load_weather_data()
+    with section('data load'):
+        df_latest, df_historical = load_weather_data()
     
     if df_latest.empty:
         st.warning("🚨 No weather data available. Run the ETL pipeline first!")
@@ -91,6 +200,12 @@ def main():
     
     selected_city = st.sidebar.selectbox("📍 Select City", df_latest['city'].unique())
     
+    all_cities = list(df_latest['city'].unique())
+    compare_cities = st.sidebar.multiselect("🌍 Compare Cities", all_cities, default=all_cities[:20])
+    df_compare = df_latest[df_latest['city'].isin(compare_cities)] if compare_cities else df_latest
+    
+    rollup_level = st.sidebar.radio("🗺️ Map Rollup", ['country', 'region'])
+    
     # Last update time
     latest_timestamp = pd.to_datetime(df_latest['timestamp']).max()
     st.sidebar.markdown(f"**Last Updated:** {latest_timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -165,41 +280,46 @@ def main():
         city_historical = df_historical[df_historical['city'] == selected_city]
         
         if not city_historical.empty:
-            col1, col2 = st.columns(2)
+            with section('chart: live trends'):
+                live_trends(selected_city, city_historical)
             
-            with col1:
-                # Temperature trend
-                fig_temp = px.line(
-                    city_historical, 
-                    x='timestamp', 
-                    y='temperature',
-                    title=f'🌡️ Temperature Trend in {selected_city}',
-                    labels={'temperature': 'Temperature (°C)', 'timestamp': 'Time'}
-                )
-                fig_temp.update_traces(line=dict(color='red', width=3))
-                st.plotly_chart(fig_temp, use_container_width=True)
+            # Derived metrics are stored columns, so these charts cost no extra queries
+            if has_derived_metrics(city_historical):
+                st.markdown("## 🧪 Comfort Indices")
+                
+                col1, col2 = st.columns(2)
                 
-            with col2:
-                # Humidity trend
-                fig_humidity = px.line(
-                    city_historical, 
-                    x='timestamp', 
-                    y='humidity',
-                    title=f'💧 Humidity Trend in {selected_city}',
-                    labels={'humidity': 'Humidity (%)', 'timestamp': 'Time'}
-                )
-                fig_humidity.update_traces(line=dict(color='blue', width=3))
-                st.plotly_chart(fig_humidity, use_container_width=True)
+                with col1, section('chart: comfort indices'):
+                    fig_indices = px.line(
+                        city_historical,
+                        x='timestamp',
+                        y=['temperature', 'dew_point', 'heat_index', 'wind_chill'],
+                        title=f'🧪 Comfort Indices in {selected_city}',
+                        labels={'value': 'Temperature (°C)', 'timestamp': 'Time', 'variable': 'Metric'}
+                    )
+                    st.plotly_chart(fig_indices, use_container_width=True)
+                
+                with col2, section('chart: 24h change'):
+                    fig_delta = px.bar(
+                        df_latest.sort_values('temperature_delta_24h', ascending=False),
+                        x='city',
+                        y='temperature_delta_24h',
+                        title='📈 24h Temperature Change by City',
+                        color='temperature_delta_24h',
+                        color_continuous_scale='RdBu_r',
+                        labels={'temperature_delta_24h': 'Change (°C)', 'city': 'City'}
+                    )
+                    st.plotly_chart(fig_delta, use_container_width=True)
     
     # BOTTOM ROW: City Comparison
     st.markdown("## 🌍 Global City Comparison")
     
     col1, col2 = st.columns(2)
     
-    with col1:
+    with col1, section('chart: temperature bar'):
         # Temperature comparison chart
         fig_bar = px.bar(
-            df_latest.sort_values('temperature', ascending=False),
+            df_compare.sort_values('temperature', ascending=False),
             x='city',
             y='temperature',
             title='🔥 Current Temperatures by City',
@@ -209,9 +329,9 @@ def main():
         )
         st.plotly_chart(fig_bar, use_container_width=True)
     
-    with col2:
+    with col2, section('chart: conditions pie'):
         # Weather conditions pie chart
-        condition_counts = df_latest['weather_condition'].value_counts()
+        condition_counts = df_compare['weather_condition'].value_counts()
         fig_pie = px.pie(
             values=condition_counts.values,
             names=condition_counts.index,
@@ -220,27 +340,65 @@ def main():
         )
         st.plotly_chart(fig_pie, use_container_width=True)
     
+    # Map view and rollups come from the catalog's per-city latest table
+    with section('map data load'):
+        map_df, rollup_df = load_map_data(rollup_level)
+    
+    if not map_df.empty:
+        st.markdown("## 🗺️ Global Map")
+        
+        col1, col2 = st.columns([2, 1])
+        
+        with col1, section('chart: map'):
+            fig_map = px.scatter_geo(
+                map_df,
+                lat='lat',
+                lon='lon',
+                color='temperature',
+                hover_name='name',
+                hover_data=['country', 'humidity', 'weather_condition'],
+                color_continuous_scale='RdYlBu_r',
+                projection='natural earth',
+                title='🌍 Latest Temperatures',
+                labels={'temperature': 'Temperature (°C)'}
+            )
+            st.plotly_chart(fig_map, use_container_width=True)
+        
+        with col2, section('chart: rollup'):
+            fig_rollup = px.bar(
+                rollup_df,
+                x=rollup_level,
+                y='avg_temperature',
+                hover_data=['cities', 'min_temperature', 'max_temperature'],
+                title=f'📊 Average Temperature by {rollup_level.title()}',
+                color='avg_temperature',
+                color_continuous_scale='RdYlBu_r',
+                labels={'avg_temperature': 'Avg Temp (°C)', rollup_level: rollup_level.title()}
+            )
+            st.plotly_chart(fig_rollup, use_container_width=True)
+    
     # Data table section
     st.markdown("## 📋 Latest Weather Data")
     
-    # Create a nice display table
-    display_columns = ['city', 'country', 'temperature', 'humidity', 
-                      'weather_condition', 'wind_speed', 'timestamp', 'data_quality_score']
-    
-    display_df = df_latest[display_columns].copy()
-    display_df['temperature'] = display_df['temperature'].round(1)
-    display_df.rename(columns={
-        'city': 'City',
-        'country': 'Country', 
-        'temperature': 'Temp (°C)',
-        'humidity': 'Humidity (%)',
-        'weather_condition': 'Condition',
-        'wind_speed': 'Wind (m/s)',
-        'timestamp': 'Last Update',
-        'data_quality_score': 'Quality Score'
-    }, inplace=True)
-    
-    st.dataframe(display_df, use_container_width=True)
+    with section('table'):
+        # Create a nice display table
+        display_columns = ['city', 'country', 'temperature', 'humidity', 
+                          'weather_condition', 'wind_speed', 'timestamp', 'data_quality_score']
+        
+        display_df = df_latest[display_columns].copy()
+        display_df['temperature'] = display_df['temperature'].round(1)
+        display_df.rename(columns={
+            'city': 'City',
+            'country': 'Country', 
+            'temperature': 'Temp (°C)',
+            'humidity': 'Humidity (%)',
+            'weather_condition': 'Condition',
+            'wind_speed': 'Wind (m/s)',
+            'timestamp': 'Last Update',
+            'data_quality_score': 'Quality Score'
+        }, inplace=True)
+        
+        st.dataframe(display_df, use_container_width=True)
     
     # Footer
     st.markdown("---")
@@ -252,5 +410,12 @@ def main():
         unsafe_allow_html=True
     )
 
+def main():
+    # Opt-in profiling: ?profile=1|cprofile|pyinstrument or WEATHER_PROFILE
+    profiler = RenderProfiler.from_settings(st.query_params.get('profile'), name='weather_dashboard')
+    with profiler:
+        render_dashboard()
+    profiler.show()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,22 +1,49 @@
 # weather_etl.py - Core ETL Pipeline
-import sqlite3
 import requests
 import pandas as pd
 from datetime import datetime
 import time
 import json
+import os
+from weather_notify import publish_update, notify_path
+from weather_storage import get_storage
+from weather_metrics import DerivedMetrics
+from weather_catalog import CityCatalog, CATALOG_CSV_PATH, catalog_db_path
+
+# Used when the city catalog has not been loaded
+DEFAULT_CITIES = ['London', 'New York', 'Tokyo', 'Sydney', 'Paris']
 
 class WeatherETL:
-    def __init__(self, api_key):
+    def __init__(self, api_key, storage=None, catalog=None, max_tier=None):
         self.api_key = api_key
+        self.storage = storage or get_storage()
+        self.metrics = DerivedMetrics(self.storage)
+        self.catalog = catalog or CityCatalog(catalog_db_path(self.storage.name, self.storage.db_path))
         self.base_url = "http://api.openweathermap.org/data/2.5/weather"
-        self.cities = ['London', 'New York', 'Tokyo', 'Sydney', 'Paris']
+        
+        if max_tier is None:
+            max_tier = int(os.environ.get('WEATHER_MAX_TIER', '1'))
+        self.cities, self.countries = self.load_cities(max_tier)
+    
+    def load_cities(self, max_tier):
+        """Cities to track from the catalog, seeding it from cities.csv if empty"""
+        try:
+            if self.catalog.count() == 0 and os.path.exists(CATALOG_CSV_PATH):
+                self.catalog.load_csv(CATALOG_CSV_PATH)
+            
+            catalog = self.catalog.cities(max_tier=max_tier)
+            if not catalog.empty:
+                return list(catalog['name']), dict(zip(catalog['name'], catalog['country']))
+        except Exception as e:
+            print(f"⚠️  City catalog unavailable, using default cities: {e}")
+        
+        return list(DEFAULT_CITIES), {}
         
     def extract_data(self, city):
         """EXTRACT: Get live weather data from API"""
         try:
             params = {
-                'q': city,
+                'q': f"{city},{self.countries[city]}" if self.countries.get(city) else city,
                 'appid': self.api_key,
                 'units': 'metric'
             }
@@ -82,73 +109,68 @@ class WeatherETL:
         return max(score, 0)
     
     def load_data(self, transformed_data):
-        """LOAD: Store data in SQLite database"""
+        """LOAD: Store a single record, returning the new row id"""
         if not transformed_data:
             return False
+        
+        row_ids = self.load_batch([transformed_data])
+        return row_ids[0] or False
+    
+    def load_batch(self, transformed_batch):
+        """LOAD: Add derived metrics and bulk-store a batch
+        
+        Returns the new row id for each record in order, None where a
+        record could not be stored.
+        """
+        if not transformed_batch:
+            return []
             
         try:
-            conn = sqlite3.connect('weather_data.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weather_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                city TEXT,
-                country TEXT,
-                temperature REAL,
-                feels_like REAL,
-                humidity INTEGER,
-                pressure INTEGER,
-                wind_speed REAL,
-                wind_direction INTEGER,
-                weather_condition TEXT,
-                weather_description TEXT,
-                cloudiness INTEGER,
-                visibility INTEGER,
-                timestamp TEXT,
-                data_quality_score INTEGER
-            )
-            ''')
-            
-            cursor.execute('''
-            INSERT INTO weather_history 
-            (city, country, temperature, feels_like, humidity, pressure, 
-             wind_speed, wind_direction, weather_condition, weather_description,
-             cloudiness, visibility, timestamp, data_quality_score)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                transformed_data['city'],
-                transformed_data['country'],
-                transformed_data['temperature'],
-                transformed_data['feels_like'],
-                transformed_data['humidity'],
-                transformed_data['pressure'],
-                transformed_data['wind_speed'],
-                transformed_data['wind_direction'],
-                transformed_data['weather_condition'],
-                transformed_data['weather_description'],
-                transformed_data['cloudiness'],
-                transformed_data['visibility'],
-                transformed_data['timestamp'],
-                transformed_data['data_quality_score']
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-            print(f"   💾 Loaded data for {transformed_data['city']} to database")
-            return True
-            
+            # Derived metrics for the whole batch in one vectorized pass;
+            # the 24h windows only take in readings once they are stored
+            enriched = self.metrics.enrich(transformed_batch, remember=False)
         except Exception as e:
-            print(f"❌ Database error: {e}")
-            return False
+            print(f"❌ Derived metrics error: {e}")
+            return [None] * len(transformed_batch)
+        
+        try:
+            row_ids = self.storage.write_rows(enriched)
+        except Exception as e:
+            # One bad record must not cost every other city its reading
+            print(f"⚠️  Batch insert failed ({e}), retrying record by record")
+            row_ids = self.load_rows_individually(enriched)
+        
+        stored = [row for row, row_id in zip(enriched, row_ids) if row_id is not None]
+        self.metrics.remember(stored)
+        if stored:
+            # Keep the catalog's per-city latest table current for map views
+            try:
+                self.catalog.update_latest(stored)
+            except Exception as e:
+                print(f"⚠️  Could not update city catalog: {e}")
+            
+            cities = ', '.join(row['city'] for row in stored)
+            print(f"   💾 Loaded data for {cities} to database")
+        
+        return row_ids
+    
+    def load_rows_individually(self, enriched):
+        """Fallback LOAD: write each record on its own so failures stay isolated"""
+        row_ids = []
+        for row in enriched:
+            try:
+                row_ids.append(self.storage.write_rows([row])[0])
+            except Exception as e:
+                print(f"❌ Database error for {row['city']}: {e}")
+                row_ids.append(None)
+        return row_ids
     
     def run_pipeline(self):
         """Run complete ETL pipeline for all cities"""
         print("🚀 STARTING WEATHER ETL PIPELINE")
         print("=" * 50)
         
-        successful_records = 0
+        transformed_batch = []
         
         for city in self.cities:
             print(f"\n🌍 Processing {city}...")
@@ -161,8 +183,23 @@ class WeatherETL:
             if not transformed_data:
                 continue
                 
-            if self.load_data(transformed_data):
-                successful_records += 1
+            transformed_batch.append(transformed_data)
+        
+        print(f"\n📦 Loading {len(transformed_batch)} records...")
+        row_ids = self.load_batch(transformed_batch)
+        
+        new_ids = {}
+        for row, row_id in zip(transformed_batch, row_ids):
+            if row_id is not None:
+                new_ids.setdefault(row['city'], []).append(row_id)
+        successful_records = sum(len(ids) for ids in new_ids.values())
+        
+        # Tell live dashboards which rows are new
+        if new_ids:
+            try:
+                publish_update(new_ids, notify_path(self.storage.name, self.storage.db_path))
+            except OSError as e:
+                print(f"⚠️  Could not publish update notification: {e}")
         
         print(f"\n" + "=" * 50)
         print(f"✅ ETL PIPELINE COMPLETED!")
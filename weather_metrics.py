@@ -0,0 +1,208 @@
+# weather_metrics.py - Vectorized Derived Metrics
+import numpy as np
+import pandas as pd
+
+# Columns added to every row before it is stored
+DERIVED_COLUMNS = [
+    'dew_point', 'heat_index', 'wind_chill', 'wind_u', 'wind_v',
+    'temperature_delta_24h', 'pressure_delta_24h', 'temperature_mean_24h'
+]
+
+WINDOW_SECONDS = 24 * 3600
+
+
+def dew_point(temperature, humidity):
+    """Dew point in °C (Magnus formula)"""
+    a, b = 17.62, 243.12
+    rh = np.clip(np.asarray(humidity, dtype=float), 1, 100)
+    t = np.asarray(temperature, dtype=float)
+    gamma = np.log(rh / 100) + a * t / (b + t)
+    return b * gamma / (a - gamma)
+
+
+def heat_index(temperature, humidity):
+    """Heat index in °C (NOAA Rothfusz regression with its adjustments)"""
+    t = np.asarray(temperature, dtype=float) * 9 / 5 + 32
+    rh = np.asarray(humidity, dtype=float)
+
+    # Simple formula first; the regression only applies above 80°F
+    simple = 0.5 * (t + 61 + (t - 68) * 1.2 + rh * 0.094)
+    simple = (simple + t) / 2
+
+    full = (-42.379 + 2.04901523 * t + 10.14333127 * rh
+            - 0.22475541 * t * rh - 6.83783e-3 * t ** 2
+            - 5.481717e-2 * rh ** 2 + 1.22874e-3 * t ** 2 * rh
+            + 8.5282e-4 * t * rh ** 2 - 1.99e-6 * t ** 2 * rh ** 2)
+
+    dry = (rh < 13) & (t >= 80) & (t <= 112)
+    full = np.where(dry, full - ((13 - rh) / 4) * np.sqrt(np.abs(17 - np.abs(t - 95)) / 17), full)
+    humid = (rh > 85) & (t >= 80) & (t <= 87)
+    full = np.where(humid, full + ((rh - 85) / 10) * ((87 - t) / 5), full)
+
+    result = np.where(simple >= 80, full, simple)
+    return (result - 32) * 5 / 9
+
+
+def wind_chill(temperature, wind_speed):
+    """Wind chill in °C (Environment Canada); air temperature outside its range"""
+    t = np.asarray(temperature, dtype=float)
+    v = np.asarray(wind_speed, dtype=float) * 3.6
+    v16 = np.power(np.maximum(v, 0), 0.16)
+    chill = 13.12 + 0.6215 * t - 11.37 * v16 + 0.3965 * t * v16
+    return np.where((t <= 10) & (v > 4.8), chill, t)
+
+
+def wind_components(wind_speed, wind_direction):
+    """Eastward (u) and northward (v) wind components in m/s
+
+    wind_direction is where the wind blows from, so a northerly wind has
+    a negative v component.
+    """
+    speed = np.asarray(wind_speed, dtype=float)
+    radians = np.deg2rad(np.asarray(wind_direction, dtype=float))
+    return -speed * np.sin(radians), -speed * np.cos(radians)
+
+
+def to_seconds(timestamps):
+    """Timestamp strings as integer seconds since the epoch"""
+    delta = pd.to_datetime(timestamps) - pd.Timestamp('1970-01-01')
+    return (delta // pd.Timedelta(seconds=1)).to_numpy(dtype='int64')
+
+
+class DerivedMetrics:
+    """Adds DERIVED_COLUMNS to batches of transformed rows
+
+    Point metrics are computed over the whole batch at once. Rolling 24h
+    metrics keep the last 24h of readings per city in memory and extend
+    that window with each stored batch, so history is only read from
+    storage the first time a city is seen.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage
+        self.windows = {}
+
+    def enrich(self, rows, remember=True):
+        """Return copies of rows with the derived columns filled in
+
+        remember=False leaves the 24h windows untouched so the caller can
+        add only the rows it actually stored, via remember().
+        """
+        if not rows:
+            return []
+
+        df = pd.DataFrame(rows)
+        df['dew_point'] = dew_point(df['temperature'], df['humidity'])
+        df['heat_index'] = heat_index(df['temperature'], df['humidity'])
+        df['wind_chill'] = wind_chill(df['temperature'], df['wind_speed'])
+        df['wind_u'], df['wind_v'] = wind_components(df['wind_speed'], df['wind_direction'])
+
+        seconds = to_seconds(df['timestamp'])
+        for column in ('temperature_delta_24h', 'pressure_delta_24h', 'temperature_mean_24h'):
+            df[column] = np.nan
+
+        for city, positions in df.groupby('city').indices.items():
+            # Process each city's readings in time order
+            positions = positions[np.argsort(seconds[positions], kind='stable')]
+            rolling = self._rolling(
+                city,
+                seconds[positions],
+                df['temperature'].to_numpy(dtype=float)[positions],
+                df['pressure'].to_numpy(dtype=float)[positions]
+            )
+            for column, values in rolling.items():
+                df.loc[df.index[positions], column] = values
+
+        # NaN (no earlier reading in the window) is stored as NULL
+        df = df.astype(object).where(df.notna(), None)
+        enriched = df.to_dict('records')
+
+        if remember:
+            self.remember(enriched)
+        return enriched
+
+    def remember(self, rows):
+        """Add stored readings to the per-city 24h windows"""
+        if not rows:
+            return
+
+        df = pd.DataFrame(rows)
+        seconds = to_seconds(df['timestamp'])
+        for city, positions in df.groupby('city').indices.items():
+            positions = positions[np.argsort(seconds[positions], kind='stable')]
+            all_seconds, all_temperature, all_pressure, _ = self._merge(
+                city,
+                seconds[positions],
+                df['temperature'].to_numpy(dtype=float)[positions],
+                df['pressure'].to_numpy(dtype=float)[positions]
+            )
+
+            # Keep only what the next batch can still reach
+            keep = all_seconds >= all_seconds[-1] - WINDOW_SECONDS
+            self.windows[city] = {
+                'seconds': all_seconds[keep],
+                'temperature': all_temperature[keep],
+                'pressure': all_pressure[keep]
+            }
+
+    def _merge(self, city, seconds, temperature, pressure):
+        """A city's window merged with new readings in time order, plus their positions"""
+        if city not in self.windows:
+            self.windows[city] = self._load_window(city, seconds[0])
+        window = self.windows[city]
+
+        # Backfilled readings may predate the window end
+        order = np.argsort(np.concatenate([window['seconds'], seconds]), kind='stable')
+        all_seconds = np.concatenate([window['seconds'], seconds])[order]
+        all_temperature = np.concatenate([window['temperature'], temperature])[order]
+        all_pressure = np.concatenate([window['pressure'], pressure])[order]
+
+        new = np.flatnonzero(order >= len(window['seconds']))
+        return all_seconds, all_temperature, all_pressure, new
+
+    def _rolling(self, city, seconds, temperature, pressure):
+        all_seconds, all_temperature, all_pressure, new = self._merge(city, seconds, temperature, pressure)
+
+        start = np.searchsorted(all_seconds, all_seconds[new] - WINDOW_SECONDS, side='left')
+        has_history = start < new
+
+        # Running sums give the window mean without re-summing each window
+        cumulative = np.concatenate([[0.0], np.cumsum(all_temperature)])
+        mean = (cumulative[new + 1] - cumulative[start]) / (new + 1 - start)
+
+        return {
+            'temperature_delta_24h': np.where(has_history, all_temperature[new] - all_temperature[start], np.nan),
+            'pressure_delta_24h': np.where(has_history, all_pressure[new] - all_pressure[start], np.nan),
+            'temperature_mean_24h': mean
+        }
+
+    def _load_window(self, city, first_second):
+        """Seed a city's window with the stored readings from the previous 24h"""
+        empty = {
+            'seconds': np.array([], dtype='int64'),
+            'temperature': np.array([], dtype=float),
+            'pressure': np.array([], dtype=float)
+        }
+        if self.storage is None:
+            return empty
+
+        start = pd.Timestamp(first_second - WINDOW_SECONDS, unit='s')
+        end = pd.Timestamp(first_second - 1, unit='s')
+        try:
+            history = self.storage.range_scan(
+                city=city,
+                start=start.strftime('%Y-%m-%d %H:%M:%S'),
+                end=end.strftime('%Y-%m-%d %H:%M:%S')
+            )
+        except Exception as e:
+            print(f"⚠️  Could not load 24h history for {city}: {e}")
+            return empty
+
+        if history.empty:
+            return empty
+
+        return {
+            'seconds': to_seconds(history['timestamp']),
+            'temperature': history['temperature'].to_numpy(dtype=float),
+            'pressure': history['pressure'].to_numpy(dtype=float)
+        }
@@ -0,0 +1,88 @@
+# weather_notify.py - Change Notifications for Live Dashboards
+import os
+import json
+import tempfile
+from datetime import datetime
+
+from weather_storage import storage_settings
+
+
+def notify_path(backend=None, db_path=None):
+    """Notification file for a storage backend, kept next to its database
+
+    The ETL and the dashboards resolve it from the same storage settings
+    as the database itself, so any processes sharing a WEATHER_DB_PATH
+    also share the file. WEATHER_NOTIFY_PATH overrides it.
+    """
+    override = os.environ.get('WEATHER_NOTIFY_PATH')
+    if override:
+        return override
+
+    backend, db_path = storage_settings(backend, db_path)
+    return f"{os.path.splitext(db_path)[0]}_updates.json"
+
+
+def publish_update(new_ids, path=None):
+    """Publish the ids of freshly loaded rows, per city"""
+    path = path or notify_path()
+    previous = read_update(path)
+    sequence = previous['sequence'] + 1 if previous else 1
+
+    payload = {
+        'sequence': sequence,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'new_ids': new_ids
+    }
+
+    # Write to a temp file and rename so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+    return sequence
+
+
+def read_update(path=None):
+    """Read the latest notification, or None if nothing was published yet"""
+    path = path or notify_path()
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class UpdateListener:
+    """Polls the notification file, re-reading it only when it changes"""
+
+    def __init__(self, path=None):
+        self.path = path or notify_path()
+        self._mtime = None
+
+        # Start from the current notification so a fresh session only sees
+        # loads that happen after it opened, not whatever was published last
+        current = read_update(self.path)
+        self.sequence = current['sequence'] if current else 0
+
+    def poll(self):
+        """Return a new notification, or None if nothing changed"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        # Every publish renames a new file into place, so the inode changes
+        # even when two writes land within the filesystem's mtime resolution
+        mtime = (stat.st_mtime_ns, stat.st_ino)
+        if mtime == self._mtime:
+            return None
+        self._mtime = mtime
+
+        update = read_update(self.path)
+        if not update or update['sequence'] <= self.sequence:
+            return None
+
+        self.sequence = update['sequence']
+        return update
@@ -0,0 +1,154 @@
+# weather_profiling.py - Opt-in Render Profiling
+import os
+import time
+import cProfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+PROFILE_DIR = 'profiles'
+
+# Timers only, or timers plus a full profiler dump per render
+MODES = ('timers', 'cprofile', 'pyinstrument')
+
+# Profiler for the render running in this thread, if any
+_active = ContextVar('weather_profiler', default=None)
+
+
+@contextmanager
+def section(name):
+    """Time a block against the active profiler; does nothing when profiling is off"""
+    profiler = _active.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.section(name):
+        yield
+
+
+class RenderProfiler:
+    """Per-render breakdown of named sections, with optional profiler dumps
+
+    Use as a context manager around a whole render. Code anywhere below it
+    (storage reads, chart helpers) can add nested timings with section().
+    """
+
+    def __init__(self, mode=None, name='dashboard', dump_dir=PROFILE_DIR):
+        self.mode = mode
+        self.name = name
+        self.dump_dir = dump_dir
+        self.timings = []
+        self.total_ms = 0.0
+        self.dump_path = None
+        self._stack = []
+        self._token = None
+        self._profiler = None
+        self._start = None
+
+    @classmethod
+    def from_settings(cls, value=None, name='dashboard'):
+        """Pick the mode from a ?profile= query value, else WEATHER_PROFILE"""
+        value = (value or os.environ.get('WEATHER_PROFILE') or '').strip().lower()
+        if value in ('', '0', 'false', 'off'):
+            return cls(None, name)
+        if value not in MODES:
+            value = 'timers'
+        return cls(value, name)
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    @contextmanager
+    def section(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        self._stack.append(name)
+        entry = {'section': ' › '.join(self._stack), 'depth': len(self._stack) - 1, 'ms': 0.0}
+        self.timings.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry['ms'] = (time.perf_counter() - start) * 1000
+            self._stack.pop()
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+
+        self._token = _active.set(self)
+        self._start_profiler()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.enabled:
+            return False
+
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+        self._stop_profiler()
+        _active.reset(self._token)
+        return False
+
+    def report(self):
+        """Section timings as a DataFrame, with time outside any section"""
+        import pandas as pd
+
+        df = pd.DataFrame(self.timings, columns=['section', 'depth', 'ms'])
+        covered = df.loc[df['depth'] == 0, 'ms'].sum()
+        other = pd.DataFrame([{'section': 'other (layout, widgets)', 'depth': 0,
+                               'ms': max(self.total_ms - covered, 0.0)}])
+        df = pd.concat([df, other], ignore_index=True)
+        df['share'] = (df['ms'] / self.total_ms * 100).round(1) if self.total_ms else 0.0
+        df['ms'] = df['ms'].round(2)
+        return df
+
+    def show(self):
+        """Render the breakdown at the bottom of the page"""
+        if not self.enabled:
+            return
+
+        import streamlit as st
+
+        report = self.report()
+        # Kept in session state so the load-test harness can collect it
+        st.session_state['render_profile'] = report
+
+        with st.expander(f"⏱️ Render profile: {self.total_ms:.0f} ms", expanded=True):
+            st.dataframe(report.drop(columns='depth'), use_container_width=True)
+            if self.dump_path:
+                st.caption(f"📁 {self.mode} dump written to `{self.dump_path}`")
+
+    def _start_profiler(self):
+        try:
+            if self.mode == 'cprofile':
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+            elif self.mode == 'pyinstrument':
+                from pyinstrument import Profiler
+                self._profiler = Profiler(async_mode='disabled')
+                self._profiler.start()
+        except (ImportError, ValueError, RuntimeError) as e:
+            # Missing package, or another profiler already running in this process
+            print(f"⚠️  {self.mode} unavailable, timing sections only: {e}")
+            self._profiler = None
+
+    def _stop_profiler(self):
+        if self._profiler is None:
+            return
+
+        os.makedirs(self.dump_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+            self.dump_path = os.path.join(self.dump_dir, f"{self.name}-{stamp}.prof")
+            self._profiler.dump_stats(self.dump_path)
+        else:
+            self._profiler.stop()
+            self.dump_path = os.path.join(self.dump_dir, f"{self.name}-{stamp}.html")
+            with open(self.dump_path, 'w', encoding='utf-8') as f:
+                f.write(self._profiler.output_html())
@@ -2,8 +2,6 @@
 import schedule
 import time
 from weather_etl import WeatherETL
-import sqlite3
-import pandas as pd
 from datetime import datetime
 
 class WeatherScheduler:
@@ -21,12 +19,12 @@ class WeatherScheduler:
     def generate_daily_report(self):
         """Generate a simple daily summary report"""
         try:
-            conn = sqlite3.connect('weather_data.db')
-            
             # Get today's data
             today = datetime.now().strftime('%Y-%m-%d')
-            query = f"SELECT * FROM weather_history WHERE timestamp LIKE '{today}%'"
-            df = pd.read_sql_query(query, conn)
+            df = self.pipeline.storage.range_scan(
+                start=f"{today} 00:00:00",
+                end=f"{today} 23:59:59"
+            )
             
             if not df.empty:
                 print(f"\n📈 TODAY'S WEATHER SUMMARY ({today})")
@@ -40,7 +38,15 @@ class WeatherScheduler:
                 print(f"📊 Total records today: {len(df)}")
                 print(f"⭐ Average data quality: {df['data_quality_score'].mean():.1f}/100")
                 
-            conn.close()
+                # Derived metrics are stored alongside the raw columns
+                if 'dew_point' in df.columns and df['dew_point'].notna().any():
+                    humid_city = df.loc[df['dew_point'].idxmax()]
+                    print(f"💧 Highest dew point: {humid_city['city']} ({humid_city['dew_point']:.1f}°C)")
+                    
+                if 'temperature_delta_24h' in df.columns and df['temperature_delta_24h'].notna().any():
+                    rising_city = df.loc[df['temperature_delta_24h'].idxmax()]
+                    print(f"📈 Biggest 24h change: {rising_city['city']} "
+                          f"({rising_city['temperature_delta_24h']:+.1f}°C)")
             
         except Exception as e:
             print(f"Report generation error: {e}")
@@ -49,7 +55,11 @@ class WeatherScheduler:
         """Start the automated scheduler"""
         print("🔄 STARTING WEATHER SCHEDULER")
         print("⏰ Scheduled runs: Every 2 hours")
-        print("📍 Tracking cities: London, New York, Tokyo, Sydney, Paris")
+        cities = self.pipeline.cities
+        if len(cities) <= 10:
+            print(f"📍 Tracking cities: {', '.join(cities)}")
+        else:
+            print(f"📍 Tracking {len(cities)} cities: {', '.join(cities[:10])}, ...")
         print("=" * 60)
         
         # Schedule jobs
@@ -0,0 +1,495 @@
+# weather_storage.py - Pluggable Storage Backends
+import os
+import time
+import queue
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from weather_metrics import DERIVED_COLUMNS
+from weather_profiling import section
+
+# Columns written by the ETL, in insert order
+COLUMNS = [
+    'city', 'country', 'temperature', 'feels_like', 'humidity', 'pressure',
+    'wind_speed', 'wind_direction', 'weather_condition', 'weather_description',
+    'cloudiness', 'visibility', 'timestamp', 'data_quality_score'
+] + DERIVED_COLUMNS
+
+# strftime formats for aggregate periods
+PERIODS = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m'
+}
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Seconds a DuckDB connection waits for another process to release the file lock
+LOCK_TIMEOUT = 10.0
+
+
+class WeatherStorage:
+    """Interface shared by all storage backends
+
+    Subclasses provide the connection handling and the few SQL expressions
+    that differ between dialects; the queries themselves live here so every
+    backend answers them the same way.
+    """
+
+    name = None
+
+    # Exceptions raised by the backend driver itself (connection, SQL, locking)
+    errors = ()
+
+    # Set once every derived metric column is known to exist
+    _has_derived = False
+
+    def write_rows(self, rows):
+        """Bulk insert transformed rows, returning their new ids in order"""
+        raise NotImplementedError
+
+    def latest(self):
+        """Latest reading for each city"""
+        query = """
+        SELECT wh1.* FROM weather_history wh1
+        INNER JOIN (
+            SELECT city, MAX(timestamp) as max_timestamp
+            FROM weather_history
+            GROUP BY city
+        ) wh2 ON wh1.city = wh2.city AND wh1.timestamp = wh2.max_timestamp
+        ORDER BY wh1.city
+        """
+        return self._read(query, ())
+
+    def range_scan(self, bucket=None, **filters):
+        """Rows matching the filters ordered by time, optionally downsampled
+
+        filters: city, start, end, days, after_id
+        bucket: downsample to averages over buckets of this many seconds
+        """
+        query, args = self._range_query(bucket, filters)
+        return self._read(query, args)
+
+    def iter_range(self, batch_size=500, **filters):
+        """Yield range_scan results as DataFrames of at most batch_size rows
+
+        Each batch is a separate keyset-paged query. Holding one cursor open
+        for a whole streamed response would keep the database locked against
+        the ETL for as long as the client takes to read it.
+        """
+        where, args = self._where(filters)
+        last = None
+        while True:
+            page_where, page_args = where, args
+            if last is not None:
+                # Row-value comparison lets SQLite seek the timestamp index
+                keyset = f"(timestamp, id) > ({self._timestamp_param()}, ?)"
+                page_where = f"{where} AND {keyset}" if where else f"WHERE {keyset}"
+                page_args = args + last
+
+            batch = self._read(f"""
+            SELECT * FROM weather_history {page_where}
+            ORDER BY timestamp, id
+            LIMIT {int(batch_size)}
+            """, page_args)
+            if batch.empty:
+                break
+            yield batch
+            if len(batch) < batch_size:
+                break
+            last = (batch['timestamp'].iloc[-1], int(batch['id'].iloc[-1]))
+
+    def count(self, limit=None, **filters):
+        """Number of rows matching the filters, counting at most limit rows"""
+        where, args = self._where(filters)
+        query = f"SELECT COUNT(*) FROM weather_history {where}"
+        if limit is not None:
+            # Stop scanning once the limit is reached instead of counting every row
+            query = f"SELECT COUNT(*) FROM (SELECT 1 FROM weather_history {where} LIMIT {int(limit)})"
+        with self._connection() as conn:
+            return conn.execute(query, args).fetchone()[0]
+
+    def aggregate(self, period='day', **filters):
+        """Temperature/humidity/quality aggregates per city and period"""
+        if period not in PERIODS:
+            raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+
+        where, args = self._where(filters)
+        derived = self._derived_expr
+        query = f"""
+        SELECT city,
+               {self._format_expr('timestamp', PERIODS[period])} as period,
+               AVG(temperature) as avg_temperature,
+               MIN(temperature) as min_temperature,
+               MAX(temperature) as max_temperature,
+               AVG(humidity) as avg_humidity,
+               AVG(data_quality_score) as avg_quality,
+               {derived('AVG', 'dew_point')} as avg_dew_point,
+               {derived('MAX', 'heat_index')} as max_heat_index,
+               {derived('MIN', 'wind_chill')} as min_wind_chill,
+               COUNT(*) as records
+        FROM weather_history {where}
+        GROUP BY city, period
+        ORDER BY period, city
+        """
+        return self._read(query, args)
+
+    def data_version(self):
+        """Changes whenever new rows are loaded
+
+        weather_history is append-only with ids that are never reused, so the
+        newest id identifies the data; MAX(id) is a single primary key lookup.
+        """
+        with self._connection() as conn:
+            row = conn.execute('SELECT MAX(id) FROM weather_history').fetchone()
+        return str(row[0] or 0)
+
+    def close(self):
+        pass
+
+    def _range_query(self, bucket, filters):
+        where, args = self._where(filters)
+
+        if bucket is None:
+            query = f"""
+            SELECT * FROM weather_history {where}
+            ORDER BY timestamp, id
+            """
+            return query, args
+
+        seconds = int(bucket)
+        if seconds <= 0:
+            raise ValueError("bucket must be a positive number of seconds")
+
+        bucket_expr = self._bucket_expr(seconds)
+        derived = self._derived_expr
+        query = f"""
+        SELECT city,
+               {self._format_expr(bucket_expr, TIMESTAMP_FORMAT)} as timestamp,
+               AVG(temperature) as temperature,
+               AVG(feels_like) as feels_like,
+               AVG(humidity) as humidity,
+               AVG(pressure) as pressure,
+               AVG(wind_speed) as wind_speed,
+               {derived('AVG', 'dew_point')} as dew_point,
+               {derived('AVG', 'heat_index')} as heat_index,
+               {derived('AVG', 'wind_chill')} as wind_chill,
+               {derived('AVG', 'wind_u')} as wind_u,
+               {derived('AVG', 'wind_v')} as wind_v,
+               COUNT(*) as samples
+        FROM weather_history {where}
+        GROUP BY city, {bucket_expr}
+        ORDER BY timestamp, city
+        """
+        return query, args
+
+    def _derived_expr(self, func, column):
+        """Aggregate of a derived column, or NULL if the table predates it
+
+        Read-only handles cannot run the schema migration, so against an
+        older database the derived values read as missing until the ETL
+        has opened it once.
+        """
+        if not self._has_derived:
+            with self._connection() as conn:
+                cursor = conn.execute('SELECT * FROM weather_history LIMIT 0')
+                existing = {d[0] for d in cursor.description}
+            if not set(DERIVED_COLUMNS) <= existing:
+                return f"{func}({column})" if column in existing else 'NULL'
+            self._has_derived = True
+        return f"{func}({column})"
+
+    def _where(self, filters):
+        unknown = set(filters) - {'city', 'start', 'end', 'days', 'after_id'}
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+        clauses, args = [], []
+        if filters.get('city'):
+            clauses.append('city = ?')
+            args.append(filters['city'])
+        if filters.get('after_id') is not None:
+            clauses.append('id > ?')
+            args.append(int(filters['after_id']))
+        if filters.get('days'):
+            # Same cutoff as SQLite's datetime('now', '-N days'), which is UTC
+            cutoff = datetime.now(timezone.utc) - timedelta(days=int(filters['days']))
+            clauses.append(f"timestamp >= {self._timestamp_param()}")
+            args.append(cutoff.strftime(TIMESTAMP_FORMAT))
+        if filters.get('start'):
+            clauses.append(f"timestamp >= {self._timestamp_param()}")
+            args.append(str(filters['start']))
+        if filters.get('end'):
+            clauses.append(f"timestamp <= {self._timestamp_param()}")
+            args.append(str(filters['end']))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return where, tuple(args)
+
+    def _read(self, query, args):
+        with self._connection() as conn:
+            with section('sql'):
+                cursor = conn.execute(query, args)
+                columns = [d[0] for d in cursor.description]
+                rows = cursor.fetchall()
+        with section('frame build'):
+            return self._normalize(pd.DataFrame(rows, columns=columns))
+
+    def _normalize(self, df):
+        """Give every backend the same column types as the SQLite table"""
+        return df
+
+    # Dialect hooks
+
+    @contextmanager
+    def _connection(self):
+        raise NotImplementedError
+
+    def _format_expr(self, expr, fmt):
+        raise NotImplementedError
+
+    def _bucket_expr(self, seconds):
+        raise NotImplementedError
+
+    def _timestamp_param(self):
+        return '?'
+
+
+class SQLiteStorage(WeatherStorage):
+    """Row-store backend on the existing weather_data.db file"""
+
+    name = 'sqlite'
+    errors = (sqlite3.Error,)
+
+    def __init__(self, db_path='weather_data.db', read_only=False, pool_size=4):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._pool = None
+
+        if read_only:
+            # Readers share a fixed set of connections instead of reconnecting
+            self._pool = queue.Queue()
+            for _ in range(pool_size):
+                self._pool.put(self._connect())
+        else:
+            self._create_schema()
+
+    def write_rows(self, rows):
+        if self.read_only:
+            raise PermissionError("Storage was opened read-only")
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            ids = []
+            for row in rows:
+                cursor.execute(f'''
+                INSERT INTO weather_history ({', '.join(COLUMNS)})
+                VALUES ({', '.join('?' for _ in COLUMNS)})
+                ''', tuple(row.get(column) for column in COLUMNS))
+                ids.append(cursor.lastrowid)
+            conn.commit()
+        return ids
+
+    def close(self):
+        if self._pool is not None:
+            while not self._pool.empty():
+                self._pool.get_nowait().close()
+
+    def _create_schema(self):
+        with self._connection() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS weather_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                city TEXT,
+                country TEXT,
+                temperature REAL,
+                feels_like REAL,
+                humidity INTEGER,
+                pressure INTEGER,
+                wind_speed REAL,
+                wind_direction INTEGER,
+                weather_condition TEXT,
+                weather_description TEXT,
+                cloudiness INTEGER,
+                visibility INTEGER,
+                timestamp TEXT,
+                data_quality_score INTEGER
+            )
+            ''')
+
+            # Time-ordered scans and keyset paging seek on (timestamp, rowid)
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_weather_history_timestamp ON weather_history(timestamp)'
+            )
+
+            # Older databases predate the derived metric columns
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(weather_history)')}
+            for column in DERIVED_COLUMNS:
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE weather_history ADD COLUMN {column} REAL')
+            conn.commit()
+
+    def _connect(self):
+        if self.read_only:
+            return sqlite3.connect(
+                f'file:{self.db_path}?mode=ro',
+                uri=True,
+                check_same_thread=False
+            )
+        return sqlite3.connect(self.db_path)
+
+    @contextmanager
+    def _connection(self):
+        if self._pool is not None:
+            conn = self._pool.get()
+            try:
+                yield conn
+            finally:
+                self._pool.put(conn)
+        else:
+            conn = self._connect()
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    def _format_expr(self, expr, fmt):
+        return f"strftime('{fmt}', {expr})"
+
+    def _bucket_expr(self, seconds):
+        return (f"datetime((CAST(strftime('%s', timestamp) AS INTEGER) / {seconds}) * {seconds}, "
+                f"'unixepoch')")
+
+
+class DuckDBStorage(WeatherStorage):
+    """Embedded columnar backend for analytics-heavy workloads
+
+    DuckDB allows either one read-write process or any number of read-only
+    ones per file, never both. Connections are opened per operation rather
+    than pooled, and an open that hits another process's lock waits for it
+    (up to LOCK_TIMEOUT) instead of failing the ETL load or the read.
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, db_path='weather_data.duckdb', read_only=False):
+        import duckdb
+
+        self._duckdb = duckdb
+        self.errors = (duckdb.Error,)
+        self.db_path = db_path
+        self.read_only = read_only
+
+        if not read_only:
+            self._create_schema()
+
+    def write_rows(self, rows):
+        if self.read_only:
+            raise PermissionError("Storage was opened read-only")
+
+        batch = pd.DataFrame(list(rows), columns=COLUMNS)
+        if batch.empty:
+            return []
+        batch['timestamp'] = pd.to_datetime(batch['timestamp'])
+
+        # Insert the whole batch as one columnar scan
+        with self._connection() as conn:
+            conn.register('weather_batch', batch)
+            ids = conn.execute(f'''
+            INSERT INTO weather_history ({', '.join(COLUMNS)})
+            SELECT {', '.join(COLUMNS)} FROM weather_batch
+            RETURNING id
+            ''').fetchall()
+            conn.unregister('weather_batch')
+        return [row[0] for row in ids]
+
+    def _create_schema(self):
+        with self._connection() as conn:
+            conn.execute('CREATE SEQUENCE IF NOT EXISTS weather_history_id_seq')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS weather_history (
+                id BIGINT PRIMARY KEY DEFAULT nextval('weather_history_id_seq'),
+                city VARCHAR,
+                country VARCHAR,
+                temperature DOUBLE,
+                feels_like DOUBLE,
+                humidity INTEGER,
+                pressure INTEGER,
+                wind_speed DOUBLE,
+                wind_direction INTEGER,
+                weather_condition VARCHAR,
+                weather_description VARCHAR,
+                cloudiness INTEGER,
+                visibility INTEGER,
+                timestamp TIMESTAMP,
+                data_quality_score INTEGER
+            )
+            ''')
+            for column in DERIVED_COLUMNS:
+                conn.execute(f'ALTER TABLE weather_history ADD COLUMN IF NOT EXISTS {column} DOUBLE')
+
+    def _normalize(self, df):
+        if 'timestamp' in df.columns and pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+            df['timestamp'] = df['timestamp'].dt.strftime(TIMESTAMP_FORMAT)
+        return df
+
+    @contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _connect(self):
+        delay = 0.02
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                return self._duckdb.connect(self.db_path, read_only=self.read_only)
+            except self._duckdb.IOException as e:
+                # Only lock conflicts are worth waiting out
+                if 'lock' not in str(e).lower() or time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+
+    def _format_expr(self, expr, fmt):
+        return f"strftime({expr}, '{fmt}')"
+
+    def _bucket_expr(self, seconds):
+        return f"time_bucket(INTERVAL '{seconds} seconds', timestamp)"
+
+    def _timestamp_param(self):
+        return 'CAST(? AS TIMESTAMP)'
+
+
+BACKENDS = {
+    'sqlite': SQLiteStorage,
+    'duckdb': DuckDBStorage
+}
+
+DEFAULT_PATHS = {
+    'sqlite': 'weather_data.db',
+    'duckdb': 'weather_data.duckdb'
+}
+
+
+def storage_settings(backend=None, db_path=None):
+    """Resolve (backend, db_path) from arguments or WEATHER_STORAGE / WEATHER_DB_PATH"""
+    backend = backend or os.environ.get('WEATHER_STORAGE', 'sqlite')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}' - choose from {', '.join(BACKENDS)}")
+
+    db_path = db_path or os.environ.get('WEATHER_DB_PATH') or DEFAULT_PATHS[backend]
+    return backend, db_path
+
+
+def get_storage(backend=None, db_path=None, read_only=False):
+    """Open the configured backend (WEATHER_STORAGE / WEATHER_DB_PATH env vars)"""
+    backend, db_path = storage_settings(backend, db_path)
+    return BACKENDS[backend](db_path, read_only=read_only)